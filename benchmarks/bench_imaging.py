@@ -0,0 +1,79 @@
+# Benchmark the screenshot resize and encode pipeline with synthetic Retina-sized images.
+#
+#   python benchmarks/bench_imaging.py [max dimension]
+#
+# For each image size and content (random noise, the worst case for every encoder, and
+# flat UI-like content, the common case for screenshots) this times "downscale" and
+# "encode_smallest", and reports the chosen format and its size. "imaging.py" only needs
+# Pillow, so it is loaded directly from its file (importing the package would import AppKit).
+import importlib.util
+import os
+import random
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+IMAGING_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "macos_grok_overlay", "imaging.py")
+spec = importlib.util.spec_from_file_location("imaging", IMAGING_PATH)
+imaging = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(imaging)
+
+# Same as SCREENSHOT_MAX_DIMENSION in "constants.py".
+DEFAULT_MAX_DIMENSION = 1568
+# Full screen captures of common Retina displays (width, height).
+SIZES = ((2880, 1800), (3024, 1964), (3456, 2234), (5120, 2880))
+REPEATS = 3
+
+
+# Generate an image of random pixels.
+def make_noise(size, rng):
+    return Image.frombytes("RGB", size, rng.randbytes(size[0] * size[1] * 3))
+
+# Generate an image that looks like an application window: flat panels, buttons, and lines of "text".
+def make_interface(size, rng):
+    width, height = size
+    image = Image.new("RGB", size, (246, 246, 246))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, width, 104), fill=(232, 232, 232))
+    draw.rectangle((0, 104, width // 5, height), fill=(238, 240, 244))
+    for y in range(150, height - 40, 48):
+        draw.rounded_rectangle((40, y, width // 5 - 40, y + 30), radius=8, fill=(220, 224, 232))
+    for y in range(160, height - 60, 44):
+        x = width // 5 + 80
+        while x < width - 200:
+            word = rng.randint(30, 160)
+            draw.rectangle((x, y, x + word, y + 22), fill=(40, 40, 40))
+            x += word + 18
+    for x in range(width // 5 + 80, width - 300, 260):
+        draw.rounded_rectangle((x, 30, x + 200, 74), radius=12, fill=(0, 122, 255))
+    return image
+
+# Time a function over a few repeats, returns (best time in seconds, last result).
+def timed(function):
+    best, result = float("inf"), None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(max_dimension):
+    rng = random.Random(0)
+    formats = ", ".join(encoding[0] for encoding in imaging.available_encodings())
+    print(f"Max dimension {max_dimension}, candidate formats: {formats}")
+    print(f"{'image':>10} {'content':>10} {'downscale':>11} {'encode':>10} {'format':>12} {'size':>10}")
+    for size in SIZES:
+        for (content, make) in (("noise", make_noise), ("interface", make_interface)):
+            image = make(size, rng)
+            downscale, _ = timed(lambda: imaging.downscale(image.copy(), max_dimension))
+            encode, (mime_type, data) = timed(lambda: imaging.encode_smallest(image.copy(), max_dimension))
+            print(
+                f"{size[0]:>5}x{size[1]:<4} {content:>10} {downscale * 1e3:>9.1f}ms {encode * 1e3:>8.1f}ms"
+                f" {mime_type:>12} {len(data) / 1024:>8.0f}KB"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_MAX_DIMENSION)
@@ -0,0 +1,96 @@
+# Benchmark the snippet engine with synthetic libraries of increasing size.
+#
+#   python benchmarks/bench_snippets.py [sizes ...]
+#
+# For each library size this times a full "SnippetLibrary.refresh" (building the trie
+# from the file), an incremental refresh after editing 1% of the snippets, and the
+# per-keystroke "SnippetTrie.step". "snippets.py" has no Apple dependencies, so it is
+# loaded directly from its file (importing the package would import AppKit).
+import importlib.util
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+SNIPPETS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "macos_grok_overlay", "snippets.py")
+spec = importlib.util.spec_from_file_location("snippets", SNIPPETS_PATH)
+snippets = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(snippets)
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+KEYSTROKES = 200_000
+
+
+# Generate a synthetic library of unique abbreviations mapped to templates.
+def make_library(size, rng):
+    library = {}
+    while len(library) < size:
+        abbreviation = "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+        library[abbreviation] = f"Template for {abbreviation}: {{{{topic}}}} in {{{{style}}}}."
+    return library
+
+# Write a library to a file, making sure its modification time changes.
+def write_library(path, library):
+    with open(path, "w") as f:
+        json.dump(library, f)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+# Time a function call in seconds.
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+# Run the benchmark for one library size, returns a row of results.
+def benchmark(size, directory, rng):
+    library = make_library(size, rng)
+    path = os.path.join(directory, f"snippets_{size}.json")
+    write_library(path, library)
+    snippet_library = snippets.SnippetLibrary(path)
+    full = timed(snippet_library.refresh)
+    # Edit 1% of the snippets (half changed, half replaced with new ones).
+    edits = max(1, size // 100)
+    keys = rng.sample(sorted(library), edits)
+    for key in keys[: edits // 2]:
+        library[key] += " (edited)"
+    for key in keys[edits // 2:]:
+        del library[key]
+    library.update(make_library(edits - edits // 2, rng))
+    write_library(path, library)
+    incremental = timed(snippet_library.refresh)
+    # Type words made of abbreviations and random prefixes, one character at a time.
+    trie = snippet_library.trie
+    words = rng.sample(sorted(library), min(len(library), 1000)) + [
+        "".join(rng.choices(string.ascii_lowercase, k=8)) for _ in range(1000)
+    ]
+    text = []
+    while len(text) < KEYSTROKES:
+        text.extend(rng.choice(words))
+        text.append(" ")
+    text = text[:KEYSTROKES]
+    def type_text():
+        step, reset = trie.step, trie.reset
+        for char in text:
+            if char == " ":
+                reset()
+            else:
+                step(char)
+    typing = timed(type_text)
+    return (size, full, incremental, 1e9 * typing / len(text))
+
+
+def main(sizes):
+    rng = random.Random(0)
+    print(f"{'snippets':>10} {'full refresh':>14} {'1% refresh':>12} {'step':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            size, full, incremental, step = benchmark(size, directory, rng)
+            print(f"{size:>10} {full * 1e3:>12.1f}ms {incremental * 1e3:>10.1f}ms {step:>8.0f}ns")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
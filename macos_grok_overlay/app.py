@@ -1,4 +1,5 @@
 # Python libraries
+import json
 import os
 import sys
 
@@ -19,17 +20,336 @@ from .constants import (
     WEBSITE,
     INITIAL_WIDTH,
     INITIAL_HEIGHT,
+    KEYSTROKE_BUFFER_TIMEOUT,
+    EXPORT_BATCH_DELAY_MS,
+    EXPORT_MESSAGE_SELECTOR,
+)
+from .apps import (
+    configure_hotkey_apps,
+    load_frontmost_app,
+    update_frontmost_app,
+)
+from .displays import (
+    display_at_point,
+    display_for_rect,
+    get_displays,
+    invalidate_displays,
+    rect_on_display,
+)
+from .export import ConversationExporter
+from .memory import (
+    MemorySampler,
+    memory_report,
+)
+from .snippets import SnippetLibrary
+from .usage import (
+    describe_usage_change,
+    get_process_usage,
 )
 from .launcher import (
     install_startup,
     uninstall_startup,
 )
+from .screenshot import (
+    capture_to_prompt,
+    window_below,
+)
+from .settings import (
+    SETTINGS,
+    SNIPPETS_FILE,
+    load_settings,
+    save_settings,
+)
 from .listener import (
-    global_show_hide_listener,
+    drain_trigger_queue,
+    finish_trigger_capture,
+    finish_keystroke_capture,
     load_custom_launcher_trigger,
     set_custom_launcher_trigger,
+    set_overlay_key,
+    start_event_tap_thread,
 )
 
+# Focus the prompt, evaluates to true if it received focus.
+FOCUS_PROMPT_SCRIPT = """
+    (function() {
+        var prompt = document.querySelector('textarea');
+        if (!prompt) { return false; }
+        prompt.focus();
+        return document.activeElement === prompt;
+    })();
+"""
+# Insert text at the cursor in the prompt (formatted with a JSON string).
+INSERT_TEXT_SCRIPT = """
+    (function(text) {
+        var prompt = document.querySelector('textarea');
+        if (!prompt) { return false; }
+        prompt.focus();
+        return document.execCommand('insertText', false, text);
+    })(%s);
+"""
+# Insert text at the start of the prompt and move the cursor to the end (formatted with a JSON string).
+PREFILL_TEXT_SCRIPT = """
+    (function(text) {
+        var prompt = document.querySelector('textarea');
+        if (!prompt) { return false; }
+        prompt.focus();
+        prompt.setSelectionRange(0, 0);
+        document.execCommand('insertText', false, text);
+        prompt.setSelectionRange(prompt.value.length, prompt.value.length);
+        return true;
+    })(%s);
+"""
+# Attach an image to the prompt by pasting it as a file (formatted with a JSON data URL and file name).
+ATTACH_IMAGE_SCRIPT = """
+    (function(dataUrl, name) {
+        var prompt = document.querySelector('textarea');
+        if (!prompt) { return false; }
+        fetch(dataUrl).then(function(response) { return response.blob(); }).then(function(blob) {
+            var transfer = new DataTransfer();
+            transfer.items.add(new File([blob], name, { type: blob.type }));
+            prompt.focus();
+            prompt.dispatchEvent(new ClipboardEvent('paste', { clipboardData: transfer, bubbles: true, cancelable: true }));
+        });
+        return true;
+    })(%s, %s);
+"""
+# Hidden-state policy (injected at document start, before the page scripts). While the overlay is
+# hidden the page sees "document.hidden", pending setTimeout/setInterval timers are cleared (and
+# re-armed with their remaining time when shown), playing media is paused, and the observers
+# registered with "observe" are disconnected. Animation frames are left to WebKit, which does not
+# run them for windows that are not visible.
+VISIBILITY_SCRIPT = """
+    (function() {
+        var overlay = window.__grokOverlay = window.__grokOverlay || {};
+        var nativeHidden = Object.getOwnPropertyDescriptor(Document.prototype, 'hidden');
+        var nativeState = Object.getOwnPropertyDescriptor(Document.prototype, 'visibilityState');
+        var native = {
+            setTimeout: window.setTimeout, setInterval: window.setInterval,
+            clearTimeout: window.clearTimeout, clearInterval: window.clearInterval
+        };
+        var timers = new Map(), nextTimer = 1;
+        var pausedMedia = [];
+        overlay.hidden = false;
+        overlay.observers = [];
+        Object.defineProperty(document, 'hidden', { configurable: true, get: function() {
+            return overlay.hidden || nativeHidden.get.call(document);
+        }});
+        Object.defineProperty(document, 'visibilityState', { configurable: true, get: function() {
+            return overlay.hidden ? 'hidden' : nativeState.get.call(document);
+        }});
+        // Timers get stable IDs so they can be cleared while hidden and re-armed on resume.
+        // A repeating timer resumed part way through a period first waits out the remaining
+        // time with a one-shot timer, then continues with its full period.
+        function arm(id, timer, delay) {
+            timer.due = Date.now() + delay;
+            if (timer.repeat && (delay === timer.delay)) { startInterval(timer); return; }
+            timer.interval = false;
+            timer.native = native.setTimeout.call(window, function() {
+                if (timer.repeat) { startInterval(timer); } else { timers.delete(id); }
+                timer.callback.apply(window, timer.args);
+            }, delay);
+        }
+        function startInterval(timer) {
+            timer.interval = true;
+            timer.due = Date.now() + timer.delay;
+            timer.native = native.setInterval.call(window, function() {
+                timer.due = Date.now() + timer.delay;
+                timer.callback.apply(window, timer.args);
+            }, timer.delay);
+        }
+        function pause(timer) {
+            if (timer.native === null) { return; }
+            (timer.interval ? native.clearInterval : native.clearTimeout).call(window, timer.native);
+            timer.native = null;
+            timer.remaining = Math.max(0, timer.due - Date.now());
+        }
+        function schedule(repeat, callback, delay, args) {
+            if (typeof callback !== 'function') { callback = new Function(String(callback)); }
+            var id = nextTimer++;
+            var timer = { repeat: repeat, callback: callback, delay: Math.max(0, Number(delay) || 0), args: args, native: null };
+            timers.set(id, timer);
+            if (overlay.hidden) { timer.remaining = timer.delay; } else { arm(id, timer, timer.delay); }
+            return id;
+        }
+        function clear(id) {
+            var timer = timers.get(id);
+            if (!timer) { return; }
+            pause(timer);
+            timers.delete(id);
+        }
+        window.setTimeout = function(callback, delay) {
+            return schedule(false, callback, delay, Array.prototype.slice.call(arguments, 2));
+        };
+        window.setInterval = function(callback, delay) {
+            return schedule(true, callback, delay, Array.prototype.slice.call(arguments, 2));
+        };
+        window.clearTimeout = clear;
+        window.clearInterval = clear;
+        // Observers registered here are disconnected while hidden ("resume" runs after reconnecting).
+        overlay.observe = function(observer, target, options, resume) {
+            overlay.observers.push({ observer: observer, target: target, options: options, resume: resume });
+            if (!overlay.hidden) { observer.observe(target, options); }
+        };
+        overlay.unobserve = function(observer) {
+            overlay.observers = overlay.observers.filter(function(entry) { return entry.observer !== observer; });
+            observer.disconnect();
+        };
+        overlay.setHidden = function(hidden) {
+            if (hidden === overlay.hidden) { return; }
+            overlay.hidden = hidden;
+            if (hidden) {
+                timers.forEach(pause);
+                overlay.observers.forEach(function(entry) { entry.observer.disconnect(); });
+                pausedMedia = Array.prototype.filter.call(document.querySelectorAll('video, audio'), function(media) {
+                    return !media.paused;
+                });
+                pausedMedia.forEach(function(media) { media.pause(); });
+            } else {
+                timers.forEach(function(timer, id) { arm(id, timer, timer.remaining); });
+                overlay.observers.forEach(function(entry) {
+                    entry.observer.observe(entry.target, entry.options);
+                    if (entry.resume) { entry.resume(); }
+                });
+                pausedMedia.forEach(function(media) { media.play(); });
+                pausedMedia = [];
+            }
+            document.dispatchEvent(new Event('visibilitychange'));
+        };
+    })();
+"""
+# Report the page background color whenever it changes.
+BACKGROUND_COLOR_SCRIPT = """
+    function sendBackgroundColor() {
+        var bgColor = window.getComputedStyle(document.body).backgroundColor;
+        window.webkit.messageHandlers.backgroundColorHandler.postMessage(bgColor);
+    }
+    window.addEventListener('load', sendBackgroundColor);
+    window.__grokOverlay.observe(new MutationObserver(sendBackgroundColor), document.body, { attributes: true, attributeFilter: ['style'] }, sendBackgroundColor);
+"""
+# Send batches of changed messages to the conversation exporter (formatted with a dictionary of
+# "selector", "delay", and "enabled"). The first batch after starting (or a resync) holds every message.
+EXPORT_SCRIPT = """
+    (function() {
+        var overlay = window.__grokOverlay = window.__grokOverlay || {};
+        var selector = %(selector)s;
+        var pending = new Set(), full = true, timer = null, path = location.pathname;
+        function role(node) {
+            return node.closest('[class*="items-end"]') ? 'user' : 'assistant';
+        }
+        function send() {
+            timer = null;
+            if (location.pathname !== path) { path = location.pathname; full = true; }
+            var messages = [];
+            document.querySelectorAll(selector).forEach(function(node, index) {
+                if (full || pending.has(node)) {
+                    messages.push({ index: index, role: role(node), text: node.innerText });
+                }
+            });
+            pending.clear();
+            if (full || messages.length) {
+                window.webkit.messageHandlers.conversationExportHandler.postMessage(
+                    { conversation: path, title: document.title, full: full, messages: messages }
+                );
+            }
+            full = false;
+        }
+        function schedule() {
+            if (!timer) { timer = setTimeout(send, %(delay)d); }
+        }
+        function collect(records) {
+            records.forEach(function(record) {
+                var node = (record.target.nodeType === 1) ? record.target : record.target.parentElement;
+                var message = node && node.closest(selector);
+                if (message) { pending.add(message); return; }
+                record.addedNodes.forEach(function(added) {
+                    if (added.nodeType !== 1) { return; }
+                    if (added.matches(selector)) { pending.add(added); }
+                    added.querySelectorAll(selector).forEach(function(m) { pending.add(m); });
+                });
+            });
+            if (pending.size) { schedule(); }
+        }
+        overlay.exportObserver = new MutationObserver(collect);
+        // The export observer stays connected while hidden (it is idle unless the page changes),
+        // so showing the overlay never requires resending the whole conversation.
+        overlay.startExport = function() {
+            overlay.exportObserver.observe(document.body, { childList: true, subtree: true, characterData: true });
+            overlay.exportResync();
+        };
+        overlay.stopExport = function() {
+            overlay.exportObserver.disconnect();
+            pending.clear();
+        };
+        overlay.exportResync = function() { full = true; schedule(); };
+        if (%(enabled)s) { overlay.startExport(); }
+    })();
+"""
+# Report typing in the prompt to the snippet engine one character at a time, and expand the
+# current word with Tab when it is an abbreviation (the match is set by "snippetMatch:").
+# Placeholders in a template look like "{{name}}", Tab selects the next one.
+SNIPPET_SCRIPT = """
+    (function() {
+        var overlay = window.__grokOverlay = window.__grokOverlay || {};
+        var placeholder = /\\{\\{[^}]*\\}\\}/;
+        overlay.snippetMatch = null;
+        function post(message) { window.webkit.messageHandlers.snippetHandler.postMessage(message); }
+        function selectPlaceholder(prompt, from) {
+            var found = placeholder.exec(prompt.value.slice(from));
+            if (!found) { return false; }
+            prompt.setSelectionRange(from + found.index, from + found.index + found[0].length);
+            return true;
+        }
+        // The caret position after the last typed character, the Python trie follows the word
+        // typed up to it (null once it was told to reset). Any other caret move starts over.
+        var caret = null;
+        function reset() {
+            overlay.snippetMatch = null;
+            if (caret !== null) { caret = null; post({ type: 'reset' }); }
+        }
+        document.addEventListener('input', function(event) {
+            if (event.target.tagName !== 'TEXTAREA') { return; }
+            overlay.snippetMatch = null;
+            if ((event.inputType === 'insertText') && event.data && (event.data.length === 1) && (event.data.trim() !== '')) {
+                post({ type: 'char', char: event.data });
+                caret = event.target.selectionEnd;
+            } else if (event.inputType === 'deleteContentBackward') {
+                post({ type: 'delete' });
+                caret = event.target.selectionEnd;
+            } else {
+                caret = null;
+                post({ type: 'reset' });
+            }
+        }, true);
+        document.addEventListener('selectionchange', function() {
+            var prompt = document.activeElement;
+            if (caret === null) { return; }
+            if (!prompt || (prompt.tagName !== 'TEXTAREA') || (prompt.selectionStart !== caret) || (prompt.selectionEnd !== caret)) { reset(); }
+        });
+        document.addEventListener('mousedown', reset, true);
+        var navigationKeys = ['ArrowLeft', 'ArrowRight', 'ArrowUp', 'ArrowDown', 'Home', 'End', 'PageUp', 'PageDown'];
+        document.addEventListener('keydown', function(event) {
+            var prompt = event.target;
+            if (prompt.tagName !== 'TEXTAREA') { return; }
+            if (navigationKeys.indexOf(event.key) !== -1) { reset(); return; }
+            if ((event.key !== 'Tab') || event.shiftKey) { return; }
+            var match = overlay.snippetMatch;
+            var end = prompt.selectionEnd;
+            var start = match ? (end - match.abbreviation.length) : end;
+            // Only expand if the abbreviation is still right before the caret.
+            if (match && (prompt.selectionStart === end) && (prompt.value.slice(start, end) === match.abbreviation)) {
+                event.preventDefault();
+                reset();
+                prompt.setSelectionRange(start, end);
+                document.execCommand('insertText', false, match.template);
+                if (!selectPlaceholder(prompt, start)) { prompt.setSelectionRange(start + match.template.length, start + match.template.length); }
+            } else if (selectPlaceholder(prompt, end)) {
+                event.preventDefault();
+            }
+        }, true);
+    })();
+"""
+
 
 # Custom window (contains entire application).
 class AppWindow(NSWindow):
@@ -50,6 +370,8 @@ class AppWindow(NSWindow):
 class AppDelegate(NSObject):
     # The main application setup.
     def applicationDidFinishLaunching_(self, notification):
+        # Load the user settings (if the user changed any).
+        load_settings()
         # Run as accessory app
         NSApp.setActivationPolicy_(NSApplicationActivationPolicyAccessory)
         # Create a borderless, floating, resizable window
@@ -82,17 +404,13 @@ class AppDelegate(NSObject):
         configuration = self.webview.configuration()
         user_content_controller = configuration.userContentController()
         user_content_controller.addScriptMessageHandler_name_(self, "backgroundColorHandler")
-        # Inject JavaScript to monitor background color changes
-        script = """
-            function sendBackgroundColor() {
-                var bgColor = window.getComputedStyle(document.body).backgroundColor;
-                window.webkit.messageHandlers.backgroundColorHandler.postMessage(bgColor);
-            }
-            window.addEventListener('load', sendBackgroundColor);
-            new MutationObserver(sendBackgroundColor).observe(document.body, { attributes: true, attributeFilter: ['style'] });
-        """
-        user_script = WKUserScript.alloc().initWithSource_injectionTime_forMainFrameOnly_(script, WKUserScriptInjectionTimeAtDocumentEnd, True)
-        user_content_controller.addUserScript_(user_script)
+        user_content_controller.addScriptMessageHandler_name_(self, "conversationExportHandler")
+        user_content_controller.addScriptMessageHandler_name_(self, "snippetHandler")
+        # Load the snippet library (reloaded incrementally whenever the file changes)
+        self.snippets = SnippetLibrary(SNIPPETS_FILE)
+        self.snippets.refresh()
+        # Inject JavaScript to monitor background color changes (and export conversations)
+        self.installUserScripts()
         # Set the delegate of the window to this parent application.
         self.window.setDelegate_(self)
         # Create status bar item with logo
@@ -123,6 +441,26 @@ class AppDelegate(NSObject):
         reset_item = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_("Restore Window", "resetSizeAndPosition:", "r")
         reset_item.setTarget_(self)
         menu.addItem_(reset_item)
+        region_item = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_("Attach Screen Region", "attachScreenRegion:", "S")
+        region_item.setTarget_(self)
+        menu.addItem_(region_item)
+        window_item = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_("Attach Window Below", "attachWindowBelow:", "")
+        window_item.setTarget_(self)
+        menu.addItem_(window_item)
+        self.prefill_item = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_("Prefill Selected Text", "togglePrefillSelection:", "")
+        self.prefill_item.setTarget_(self)
+        menu.addItem_(self.prefill_item)
+        self.export_item = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_("Export Conversations", "toggleExport:", "")
+        self.export_item.setTarget_(self)
+        self.export_item.setState_(NSOnState if SETTINGS["export_conversations"] else NSOffState)
+        menu.addItem_(self.export_item)
+        self.follow_item = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_("Show on Cursor Display", "toggleFollowCursorDisplay:", "")
+        self.follow_item.setTarget_(self)
+        self.follow_item.setState_(NSOnState if SETTINGS["follow_cursor_display"] else NSOffState)
+        menu.addItem_(self.follow_item)
+        memory_item = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_("Memory Usage", "showMemoryUsage:", "")
+        memory_item.setTarget_(self)
+        menu.addItem_(memory_item)
         set_trigger_item = NSMenuItem.alloc().initWithTitle_action_keyEquivalent_("Change Shortcut", "setTrigger:", "")
         set_trigger_item.setTarget_(self)
         menu.addItem_(set_trigger_item)
@@ -141,25 +479,28 @@ class AppDelegate(NSObject):
         NSNotificationCenter.defaultCenter().addObserver_selector_name_object_(
             self, 'windowDidResize:', NSWindowDidResizeNotification, self.window
         )
-        # Create the event tap for key-down events
-        tap = CGEventTapCreate(
-            kCGSessionEventTap, # Tap at the session level
-            kCGHeadInsertEventTap, # Insert at the head of the event queue
-            kCGEventTapOptionDefault, # Actively filter events
-            CGEventMaskBit(kCGEventKeyDown), # Capture key-down events
-            global_show_hide_listener(self), # Your callback function
-            None # Optional user info (refcon)
+        # Rebuild the cached display geometry only when the displays change.
+        NSNotificationCenter.defaultCenter().addObserver_selector_name_object_(
+            self, 'screenParametersDidChange:', NSApplicationDidChangeScreenParametersNotification, None
         )
-        if tap:
-            # Integrate the tap into the run loop
-            source = CFMachPortCreateRunLoopSource(None, tap, 0)
-            CFRunLoopAddSource(CFRunLoopGetCurrent(), source, kCFRunLoopCommonModes)
-            CGEventTapEnable(tap, True)
-            CFRunLoopRun() # Start the run loop
-        else:
-            print("Failed to create event tap. Check Accessibility permissions.")
+        # Track the frontmost app (for apps that should receive the launch trigger untouched).
+        configure_hotkey_apps(SETTINGS["hotkey_app_mode"], SETTINGS["hotkey_app_bundle_ids"])
+        load_frontmost_app()
+        NSWorkspace.sharedWorkspace().notificationCenter().addObserver_selector_name_object_(
+            self, 'applicationDidActivate:', NSWorkspaceDidActivateApplicationNotification, None
+        )
+        # Sample the memory of the app and its web content process in the background.
+        self.memory_sampler = None
+        if SETTINGS["memory_sample_interval"] > 0:
+            self.memory_sampler = MemorySampler(self, SETTINGS["memory_sample_interval"], SETTINGS["memory_budget_mb"])
+            self.memory_sampler.pids.update(self.helperPids())
+            self.memory_sampler.start()
         # Load the custom launch trigger if the user set it.
         load_custom_launcher_trigger()
+        self.prefill_item.setState_(NSOnState if SETTINGS["prefill_selection"] else NSOffState)
+        # Listen for the launch trigger on a dedicated event tap thread.
+        if not start_event_tap_thread(self):
+            print("Failed to create event tap. Check Accessibility permissions.")
         # Make sure this window is shown and focused.
         self.showWindow_(None)
 
@@ -173,28 +514,157 @@ class AppDelegate(NSObject):
         self.window.setFrame_display_(self.initialRectOnScreen(INITIAL_WIDTH, INITIAL_HEIGHT), True)
         self.showWindow_(None)
 
+    # Get the default window frame on a display (the first display if none is given).
     @objc.python_method
-    def initialRectOnScreen(self, width, height):
-        screen_frame = NSScreen.mainScreen().visibleFrame()
+    def initialRectOnScreen(self, width, height, display=None):
+        screen_frame = (display or get_displays()[0])["visible"]
         screen_width, screen_height = screen_frame.size.width, screen_frame.size.height
         screen_x, screen_y = screen_frame.origin.x, screen_frame.origin.y
         new_x = screen_x + (screen_width - width) / 2
-        new_y = (screen_y + (screen_height - height) / 2) * 0.25
+        # Place the window low on the screen (a quarter of the way up the free space).
+        new_y = screen_y + (screen_height - height) / 2 * 0.25
 
         return NSMakeRect(new_x, new_y, width, height)
 
     # Logic to show the overlay, make it the key window, and focus on the typing area.
     def showWindow_(self, sender):
+        if SETTINGS["follow_cursor_display"]:
+            self.moveToCursorDisplay()
+        # Pick up any edits to the snippet library (only a file "stat" when unchanged).
+        if self.snippets.refresh():
+            self.snippets.trie.reset()
         self.window.makeKeyAndOrderFront_(None)
         NSApp.activateIgnoringOtherApps_(True)
-        # Execute the JavaScript to focus the textarea in the WKWebView
+        set_overlay_key(True)
+        self.setPageHidden(False)
+        # Show a memory budget alert that was raised while the overlay was in the background.
+        self.showMemoryAlert()
+        # Execute the JavaScript to focus the textarea in the WKWebView, keys typed
+        # before it reports focus are replayed once it does (or after a timeout).
         self.webview.evaluateJavaScript_completionHandler_(
-            "document.querySelector('textarea').focus();", None
+            FOCUS_PROMPT_SCRIPT, self.promptFocusChecked
         )
+        self.performSelector_withObject_afterDelay_("flushKeystrokes:", None, KEYSTROKE_BUFFER_TIMEOUT)
+
+    # Completion of the focus script, replays buffered keys once the prompt has focus.
+    @objc.python_method
+    def promptFocusChecked(self, result, error):
+        if result:
+            self.flushKeystrokes_(None)
+
+    # Type any keys that were buffered during the summon into the prompt.
+    def flushKeystrokes_(self, sender):
+        text = finish_keystroke_capture()
+        if text:
+            self.webview.evaluateJavaScript_completionHandler_(
+                INSERT_TEXT_SCRIPT % json.dumps(text), None
+            )
+
+    # Move the window to the display under the cursor, restoring its last frame on that display.
+    @objc.python_method
+    def moveToCursorDisplay(self):
+        display = display_at_point(NSEvent.mouseLocation())
+        if (display is None) or (display["id"] == display_for_rect(self.window.frame())["id"]):
+            return
+        saved = SETTINGS["display_frames"].get(str(display["id"]))
+        frame = NSRectFromString(saved) if saved else None
+        if (frame is None) or (not rect_on_display(frame, display)):
+            size = self.window.frame().size
+            frame = self.initialRectOnScreen(size.width, size.height, display)
+            # Shrink the window to fit on displays smaller than the window.
+            if not rect_on_display(frame, display):
+                visible = display["visible"].size
+                frame = self.initialRectOnScreen(min(size.width, visible.width), min(size.height, visible.height), display)
+        self.window.setFrame_display_(frame, False)
+
+    # Remember the window frame for the display it is on (saved to settings when hidden).
+    @objc.python_method
+    def rememberDisplayFrame(self):
+        display = display_for_rect(self.window.frame())
+        if display is not None:
+            SETTINGS["display_frames"][str(display["id"])] = NSStringFromRect(self.window.frame())
+            self.display_frames_changed = True
+
+    # Toggle showing the overlay on the display under the cursor.
+    def toggleFollowCursorDisplay_(self, sender):
+        SETTINGS["follow_cursor_display"] = not SETTINGS["follow_cursor_display"]
+        save_settings()
+        self.follow_item.setState_(NSOnState if SETTINGS["follow_cursor_display"] else NSOffState)
+
+    # Handler for display changes (connected, removed, rearranged, resolution changes).
+    def screenParametersDidChange_(self, notification):
+        invalidate_displays()
+
+    # Handler for when any application becomes the frontmost application.
+    def applicationDidActivate_(self, notification):
+        update_frontmost_app(notification.userInfo()[NSWorkspaceApplicationKey])
+
+    # Handler for when the window moves.
+    def windowDidMove_(self, notification):
+        self.rememberDisplayFrame()
+
+    # Handlers for when the window gains or loses keyboard focus (e.g. a click in another app).
+    def windowDidBecomeKey_(self, notification):
+        set_overlay_key(True)
+
+    def windowDidResignKey_(self, notification):
+        set_overlay_key(False)
 
     # Hide the overlay and allow focus to return to the next visible application.
     def hideWindow_(self, sender):
         NSApp.hide_(None)
+
+    # Called for every way the app is hidden (hideWindow_, AppWindow.close, Command+H).
+    def applicationDidHide_(self, notification):
+        set_overlay_key(False)
+        self.setPageHidden(True)
+        if getattr(self, "display_frames_changed", False):
+            self.display_frames_changed = False
+            save_settings()
+
+    # Apply the hidden-state policy to the page, and report the CPU use and wakeups while hidden.
+    @objc.python_method
+    def setPageHidden(self, hidden):
+        if hidden == getattr(self, "page_hidden", False):
+            return
+        self.page_hidden = hidden
+        self.webview.evaluateJavaScript_completionHandler_(
+            f"window.__grokOverlay && window.__grokOverlay.setHidden({json.dumps(hidden)});", None
+        )
+        pids = {"overlay": os.getpid(), **self.helperPids()}
+        # The WebKit helper processes can be replaced (after a crash), keep the sampler current.
+        if getattr(self, "memory_sampler", None) is not None:
+            self.memory_sampler.pids.update(pids)
+        usage = {name: get_process_usage(pid) for (name, pid) in pids.items() if pid}
+        if hidden:
+            self.hidden_usage = usage
+            return
+        before = getattr(self, "hidden_usage", {})
+        changes = [
+            f"{name} {describe_usage_change(before[name], usage[name])}"
+            for name in usage if before.get(name) and usage[name]
+        ]
+        if changes:
+            elapsed = next(iter(usage.values()))["time"] - next(iter(before.values()))["time"]
+            print(f"While hidden for {elapsed:.0f}s:\n  " + "\n  ".join(changes), flush=True)
+
+    # Get the process ID of the web view's WebContent process (or None if unavailable).
+    @objc.python_method
+    def webContentPid(self):
+        if self.webview.respondsToSelector_("_webProcessIdentifier"):
+            return self.webview._webProcessIdentifier() or None
+        return None
+
+    # Get the process IDs of the WebKit helper processes by role (None where unavailable).
+    # WebKit only exposes these through private methods, so each one is checked first.
+    @objc.python_method
+    def helperPids(self):
+        process_pool = self.webview.configuration().processPool()
+        pids = {"web content": self.webContentPid(), "networking": None, "gpu": None}
+        for (role, selector) in (("networking", "_networkProcessIdentifier"), ("gpu", "_gpuProcessIdentifier")):
+            if process_pool.respondsToSelector_(selector):
+                pids[role] = getattr(process_pool, selector)() or None
+        return pids
     
     # Go to the default landing website for the overlay (in case accidentally navigated away).
     def goToWebsite_(self, sender):
@@ -216,6 +686,117 @@ class AppDelegate(NSObject):
         if uninstall_startup():
             NSApp.hide_(None)
 
+    # Select a region of the screen and attach it to the prompt.
+    def attachScreenRegion_(self, sender):
+        # Hide the overlay so that it is not in the way of the selection.
+        self.hideWindow_(None)
+        capture_to_prompt(self)
+
+    # Attach the window underneath the overlay to the prompt.
+    def attachWindowBelow_(self, sender):
+        window_id = window_below(self.window.windowNumber())
+        if window_id is None:
+            print("No window found below the overlay.", flush=True)
+            return
+        capture_to_prompt(self, window_id)
+
+    # Receive an encoded screenshot (data URL) from the capture thread and paste it into the prompt.
+    def attachImage_(self, data_url):
+        self.showWindow_(None)
+        if not data_url:
+            return
+        extension = data_url[len("data:image/"):data_url.index(";")]
+        self.webview.evaluateJavaScript_completionHandler_(
+            ATTACH_IMAGE_SCRIPT % (json.dumps(data_url), json.dumps(f"screenshot.{extension}")), None
+        )
+
+    # Toggle prefilling the prompt with the text selected in the frontmost app at summon.
+    def togglePrefillSelection_(self, sender):
+        SETTINGS["prefill_selection"] = not SETTINGS["prefill_selection"]
+        save_settings()
+        self.prefill_item.setState_(NSOnState if SETTINGS["prefill_selection"] else NSOffState)
+
+    # (Re)install the scripts that are injected into every page load.
+    @objc.python_method
+    def installUserScripts(self):
+        user_content_controller = self.webview.configuration().userContentController()
+        user_content_controller.removeAllUserScripts()
+        export_script = EXPORT_SCRIPT % {
+            "selector": json.dumps(EXPORT_MESSAGE_SELECTOR),
+            "delay": EXPORT_BATCH_DELAY_MS,
+            "enabled": json.dumps(SETTINGS["export_conversations"]),
+        }
+        scripts = (
+            (VISIBILITY_SCRIPT, WKUserScriptInjectionTimeAtDocumentStart),
+            (BACKGROUND_COLOR_SCRIPT, WKUserScriptInjectionTimeAtDocumentEnd),
+            (export_script, WKUserScriptInjectionTimeAtDocumentEnd),
+            (SNIPPET_SCRIPT, WKUserScriptInjectionTimeAtDocumentEnd),
+        )
+        for (script, injection_time) in scripts:
+            user_script = WKUserScript.alloc().initWithSource_injectionTime_forMainFrameOnly_(script, injection_time, True)
+            user_content_controller.addUserScript_(user_script)
+
+    # Toggle mirroring the open conversation to Markdown files in the export directory.
+    def toggleExport_(self, sender):
+        SETTINGS["export_conversations"] = not SETTINGS["export_conversations"]
+        save_settings()
+        self.export_item.setState_(NSOnState if SETTINGS["export_conversations"] else NSOffState)
+        self.installUserScripts()
+        if SETTINGS["export_conversations"]:
+            self.exporter = ConversationExporter(SETTINGS["export_dir"])
+            print(f"Exporting conversations to:\n  {self.exporter.directory}", flush=True)
+            self.webview.evaluateJavaScript_completionHandler_("window.__grokOverlay.startExport();", None)
+        else:
+            self.webview.evaluateJavaScript_completionHandler_("window.__grokOverlay.stopExport();", None)
+
+    # Receive the selected text from the capture thread and put it at the start of the prompt.
+    def prefillSelection_(self, text):
+        # Skip if the trigger hid the overlay instead of showing it.
+        if NSApp.isHidden() or (not self.window.isVisible()):
+            return
+        self.webview.evaluateJavaScript_completionHandler_(
+            PREFILL_TEXT_SCRIPT % json.dumps(text + "\n\n"), None
+        )
+
+    # Show the recorded memory usage of the app and its web content process.
+    def showMemoryUsage_(self, sender):
+        ring = None
+        if self.memory_sampler is not None:
+            self.memory_sampler.sample()
+            ring = self.memory_sampler.ring
+        alert = NSAlert.alloc().init()
+        alert.setMessageText_("Memory Usage")
+        alert.setInformativeText_("\n".join(memory_report(ring)))
+        NSApp.activateIgnoringOtherApps_(True)
+        alert.runModal()
+
+    # Receive a memory budget alert from the sampler. It is only shown right away if the overlay
+    # is already the active app (never taking focus from another app), otherwise on the next summon.
+    def memoryBudgetExceeded_(self, message):
+        print(f"Warning: {message}", flush=True)
+        self.memory_alert = message
+        if NSApp.isActive() and self.window.isVisible():
+            self.showMemoryAlert()
+
+    # Attach a pending memory budget alert to the overlay window as a sheet.
+    @objc.python_method
+    def showMemoryAlert(self):
+        if not getattr(self, "memory_alert", None):
+            return
+        alert = NSAlert.alloc().init()
+        alert.setMessageText_("High memory usage")
+        alert.setInformativeText_(self.memory_alert)
+        alert.beginSheetModalForWindow_completionHandler_(self.window, None)
+        self.memory_alert = None
+
+    # Handle trigger matches queued by the event tap thread.
+    def handleTriggerQueue_(self, sender):
+        drain_trigger_queue(self)
+
+    # Finish capturing a new trigger once the user pauses typing.
+    def finishTriggerCapture_(self, sender):
+        finish_trigger_capture()
+
     # Handle the 'Set Trigger' menu item click.
     def setTrigger_(self, sender):
         set_custom_launcher_trigger(self)
@@ -242,6 +823,9 @@ class AppDelegate(NSObject):
             # Paste
             elif key == 'v':
                 self.window.firstResponder().paste_(None)
+            # Attach a screen region
+            elif key.lower() == 's' and key_shift:
+                self.attachScreenRegion_(None)
             # Hide
             elif key == 'h':
                 self.hideWindow_(None)
@@ -257,6 +841,7 @@ class AppDelegate(NSObject):
         bounds = self.window.contentView().bounds()
         w, h = bounds.size.width, bounds.size.height
         self.webview.setFrame_(NSMakeRect(0, 0, w, h))
+        self.rememberDisplayFrame()
 
     # Handler for setting the background color based on the web page background color.
     def userContentController_didReceiveScriptMessage_(self, userContentController, message):
@@ -267,6 +852,38 @@ class AppDelegate(NSObject):
                 rgb_values = [float(val) for val in bg_color_str[bg_color_str.index("(")+1:bg_color_str.index(")")].split(",")]
                 r, g, b = [val / 255.0 for val in rgb_values[:3]]
                 color = NSColor.colorWithCalibratedRed_green_blue_alpha_(r, g, b, 1.0)
+        elif message.name() == "snippetHandler":
+            body = message.body()
+            trie = self.snippets.trie
+            if body["type"] == "char":
+                template = trie.step(str(body["char"]))
+            elif body["type"] == "delete":
+                template = trie.back()
+            else:
+                trie.reset()
+                template = None
+            # Only talk to the page when there is a match (the page clears it on every input).
+            if template is not None:
+                match = {"abbreviation": trie.word(), "template": template}
+                self.webview.evaluateJavaScript_completionHandler_(
+                    f"window.__grokOverlay.snippetMatch = {json.dumps(match)};", None
+                )
+        elif message.name() == "conversationExportHandler":
+            if not SETTINGS["export_conversations"]:
+                return
+            if getattr(self, "exporter", None) is None:
+                self.exporter = ConversationExporter(SETTINGS["export_dir"])
+            body = message.body()
+            messages = [
+                {"index": int(m["index"]), "role": str(m["role"]), "text": str(m["text"])}
+                for m in body["messages"]
+            ]
+            applied = self.exporter.apply_batch(
+                str(body["conversation"]), messages, full=bool(body["full"]), title=str(body["title"])
+            )
+            # Ask the page for every message again if the batch could not be applied.
+            if not applied:
+                self.webview.evaluateJavaScript_completionHandler_("window.__grokOverlay.exportResync();", None)
 
     # Logic for checking what color the logo in the status bar should be, and setting appropriate logo.
     def updateStatusItemImage(self):
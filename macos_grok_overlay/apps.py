@@ -0,0 +1,40 @@
+# Python libraries
+import os
+
+# Apple libraries
+from AppKit import NSWorkspace
+
+# The frontmost application, kept current by workspace activation notifications so
+# that the event tap never has to query the system while handling a key press.
+FRONTMOST_APP = {"bundle_id": None, "pid": None}
+# Applications where the launcher trigger is passed through untouched. In "deny" mode
+# the trigger passes through in the listed apps, in "allow" mode it passes through in
+# every app that is not listed. The overlay itself always handles the trigger.
+HOTKEY_APPS = {"allow": False, "bundle_ids": frozenset()}
+OWN_PID = os.getpid()
+
+
+# Record a newly activated application (an NSRunningApplication).
+def update_frontmost_app(application):
+    if application is None:
+        return
+    FRONTMOST_APP["bundle_id"] = application.bundleIdentifier()
+    FRONTMOST_APP["pid"] = application.processIdentifier()
+
+# Initialize the frontmost application (later updates come from notifications).
+def load_frontmost_app():
+    update_frontmost_app(NSWorkspace.sharedWorkspace().frontmostApplication())
+
+# Set which applications receive the launcher trigger untouched.
+def configure_hotkey_apps(mode, bundle_ids):
+    if (mode == "allow") and (not bundle_ids):
+        print("Ignoring the \"allow\" hotkey app mode with no bundle IDs listed, the trigger is handled in every app.", flush=True)
+        mode = "deny"
+    HOTKEY_APPS["allow"] = (mode == "allow")
+    HOTKEY_APPS["bundle_ids"] = frozenset(bundle_ids)
+
+# Check whether the launcher trigger should pass through to the frontmost application.
+def trigger_passes_through():
+    if FRONTMOST_APP["pid"] == OWN_PID:
+        return False
+    return (FRONTMOST_APP["bundle_id"] in HOTKEY_APPS["bundle_ids"]) != HOTKEY_APPS["allow"]
@@ -23,10 +23,36 @@ LAUNCHER_TRIGGER_MASK = (
     kCGEventFlagMaskAlternate |
     kCGEventFlagMaskCommand
 )
-# Default trigger is "Option + Space".
+# Default trigger is "Option + Space" (see "triggers.py" for double tap and sequence triggers).
 LAUNCHER_TRIGGER = {
     "flags": kCGEventFlagMaskAlternate,
     "key": 49
 }
 INITIAL_WIDTH = 580
 INITIAL_HEIGHT = 550
+# Keys typed right after a summon are held until the prompt has focus.
+KEYSTROKE_BUFFER_TIMEOUT = 0.75 # Seconds before buffered keys are flushed regardless.
+KEYSTROKE_BUFFER_LIMIT = 256 # Maximum number of buffered characters.
+# Screenshots attached to the prompt are downscaled to fit this many pixels (default, see settings).
+SCREENSHOT_MAX_DIMENSION = 1568
+# Selected text from the frontmost app is only prefilled if it is read within this many seconds.
+SELECTION_PREFILL_DEADLINE = 0.2
+# Conversation export (mirrors the open conversation to Markdown files).
+EXPORT_MESSAGE_SELECTOR = ".message-bubble" # Elements on the page that hold one message each.
+EXPORT_BATCH_DELAY_MS = 500 # Changes on the page are batched for this long before being sent.
+# Memory sampling (resident and footprint of the app and its WebContent process).
+MEMORY_SAMPLE_CAPACITY = 4096 # Number of samples kept in the ring buffer file.
+MEMORY_SAMPLE_INTERVAL = 60 # Seconds between samples (default, see settings).
+MEMORY_BUDGET_MB = 1536 # Total footprint that raises an alert (default, see settings).
+# Shortcuts that a new launcher trigger may not use, as (flags, keycode, description).
+RESERVED_SHORTCUTS = (
+    (kCGEventFlagMaskCommand, 0, "Select All"),
+    (kCGEventFlagMaskCommand, 8, "Copy"),
+    (kCGEventFlagMaskCommand, 7, "Cut"),
+    (kCGEventFlagMaskCommand, 9, "Paste"),
+    (kCGEventFlagMaskCommand, 4, "Hide"),
+    (kCGEventFlagMaskCommand, 12, "Quit"),
+    (kCGEventFlagMaskCommand | kCGEventFlagMaskShift, 1, "Attach Screen Region"),
+    (kCGEventFlagMaskCommand, 49, "Spotlight"),
+    (kCGEventFlagMaskCommand, 48, "the App Switcher"),
+)
@@ -0,0 +1,48 @@
+# Apple libraries
+from AppKit import (
+    NSIntersectsRect,
+    NSMidX,
+    NSMidY,
+    NSMouseInRect,
+    NSPoint,
+    NSScreen,
+)
+
+# Cached display geometry, enumerated once and only rebuilt after the screen parameters
+# change (see "invalidate_displays"). Each display is a dictionary with "id" (the display
+# number), "frame" and "visible" (the frame without the menu bar and dock).
+DISPLAYS = {"screens": None}
+
+
+# Get the list of displays (the first is the one with the menu bar).
+def get_displays():
+    if DISPLAYS["screens"] is None:
+        DISPLAYS["screens"] = [
+            {
+                "id": int(screen.deviceDescription()["NSScreenNumber"]),
+                "frame": screen.frame(),
+                "visible": screen.visibleFrame(),
+            }
+            for screen in NSScreen.screens()
+        ]
+    return DISPLAYS["screens"]
+
+# Forget the cached display geometry (called when the screen parameters change).
+def invalidate_displays():
+    DISPLAYS["screens"] = None
+
+# Get the display that contains a point in screen coordinates (defaults to the first display).
+def display_at_point(point):
+    displays = get_displays()
+    for display in displays:
+        if NSMouseInRect(point, display["frame"], False):
+            return display
+    return displays[0] if displays else None
+
+# Get the display that contains the center of a rectangle.
+def display_for_rect(rect):
+    return display_at_point(NSPoint(NSMidX(rect), NSMidY(rect)))
+
+# Check whether a rectangle is at least partly visible on a display.
+def rect_on_display(rect, display):
+    return NSIntersectsRect(rect, display["visible"])
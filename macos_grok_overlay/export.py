@@ -0,0 +1,91 @@
+# Python libraries
+import hashlib
+import re
+from pathlib import Path
+
+
+# Mirrors conversations to Markdown files, one per conversation. Batches of changed
+# messages are applied by appending new messages and rewriting only the file tail
+# starting at the first changed message, never the whole conversation.
+class ConversationExporter:
+    def __init__(self, directory):
+        self.directory = Path(directory).expanduser()
+        # conversation id -> {"path", "header", "messages": [rendered bytes], "digests", "offsets", "size"}
+        self.conversations = {}
+
+    # Get the Markdown file path for a conversation (the page path, made file-name safe).
+    def path_for(self, conversation_id):
+        name = re.sub(r"[^A-Za-z0-9_-]+", "-", conversation_id).strip("-")
+        return self.directory / f"{name}.md"
+
+    # Render one message as Markdown.
+    @staticmethod
+    def render(role, text):
+        return f"### {role.title()}\n\n{text.strip()}\n\n".encode("utf-8")
+
+    # Apply a batch of messages (dicts with "index", "role", "text") for a conversation.
+    # When "full" is set the batch holds the whole conversation and replaces the file.
+    # Returns False if the batch cannot be applied (the page should resend everything).
+    # A file that cannot be written (moved, deleted, no permission) drops the conversation,
+    # so the resend rewrites it from scratch.
+    def apply_batch(self, conversation_id, messages, full=False, title=""):
+        if not re.search(r"[A-Za-z0-9]", conversation_id):
+            return True # Nothing to export on pages without a conversation.
+        state = self.conversations.get(conversation_id)
+        if full or (state is None):
+            if not full:
+                return False
+            header = f"# {title or conversation_id}\n\n".encode("utf-8")
+            state = {"path": self.path_for(conversation_id), "header": header, "messages": [], "digests": [], "offsets": [], "size": 0}
+            self.conversations[conversation_id] = state
+            first_changed = 0
+        else:
+            first_changed = len(state["messages"])
+        rendered, digests = state["messages"], state["digests"]
+        for message in sorted(messages, key=lambda m: m["index"]):
+            index = int(message["index"])
+            data = self.render(message["role"], message["text"])
+            digest = hashlib.blake2b(data, digest_size=16).digest()
+            if index < len(rendered):
+                if digests[index] != digest:
+                    rendered[index], digests[index] = data, digest
+                    first_changed = min(first_changed, index)
+            elif index == len(rendered):
+                rendered.append(data)
+                digests.append(digest)
+            else:
+                # A message was skipped, the state is out of sync with the page.
+                del self.conversations[conversation_id]
+                return False
+        try:
+            self.write(state, 0 if full else first_changed)
+        except OSError as error:
+            del self.conversations[conversation_id]
+            print(f"Could not export conversation to {state['path']}:\n  {error}", flush=True)
+            # A failed full write would fail again, wait for the next change before retrying.
+            return full
+        return True
+
+    # Write all messages starting at "first" to the file, keeping everything before it.
+    def write(self, state, first):
+        messages, offsets = state["messages"], state["offsets"]
+        if (first >= len(messages)) and (first > 0):
+            return
+        path = state["path"]
+        if first == 0:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            mode, position = "wb", 0
+        else:
+            mode, position = "r+b", (offsets[first] if first < len(offsets) else state["size"])
+        del offsets[first:]
+        with open(path, mode) as f:
+            f.seek(position)
+            if first == 0:
+                f.write(state["header"])
+                position = len(state["header"])
+            for data in messages[first:]:
+                offsets.append(position)
+                f.write(data)
+                position += len(data)
+            f.truncate()
+        state["size"] = position
@@ -0,0 +1,65 @@
+# Python libraries
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+# Image libraries
+from PIL import Image, features
+
+
+# Candidate encodings as (Pillow format, MIME type, save options), the smallest output is kept.
+ENCODINGS = (
+    ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    ("JPEG", "image/jpeg", {"quality": 85, "optimize": True}),
+    ("PNG", "image/png", {"compress_level": 6}),
+)
+# Thread pools are created once and reused between captures.
+#  PIPELINE_POOL runs whole capture jobs (off the main thread),
+#  ENCODER_POOL runs the candidate encodings of one image in parallel.
+POOLS = {"pipeline": None, "encoder": None}
+
+
+# Get the thread pool that runs whole capture jobs.
+def get_pipeline_pool():
+    if POOLS["pipeline"] is None:
+        POOLS["pipeline"] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ImagePipeline")
+    return POOLS["pipeline"]
+
+# Get the thread pool that runs individual encodings.
+def get_encoder_pool():
+    if POOLS["encoder"] is None:
+        POOLS["encoder"] = ThreadPoolExecutor(max_workers=len(ENCODINGS), thread_name_prefix="ImageEncoder")
+    return POOLS["encoder"]
+
+# Get the encodings supported by the installed Pillow.
+def available_encodings():
+    return [e for e in ENCODINGS if (e[0] != "WEBP") or features.check("webp")]
+
+# Shrink an image (in place) so that neither side is larger than "max_dimension".
+def downscale(image, max_dimension):
+    if max(image.size) > max_dimension:
+        # A reducing gap lets Pillow use a fast integer reduction before resampling.
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS, reducing_gap=2.0)
+    return image
+
+# Encode an image with one format, returns (MIME type, bytes).
+def encode(image, image_format, mime_type, options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return mime_type, buffer.getvalue()
+
+# Downscale an image and encode it with every available format, returns the smallest (MIME type, bytes).
+def encode_smallest(image, max_dimension):
+    image = downscale(image, max_dimension)
+    # Screenshots are opaque, dropping alpha lets every format (including JPEG) encode it.
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.load()
+    pool = get_encoder_pool()
+    futures = [pool.submit(encode, image, *encoding) for encoding in available_encodings()]
+    return min((f.result() for f in futures), key=lambda result: len(result[1]))
+
+# Open an image file and prepare it with "encode_smallest".
+def prepare_image_file(path, max_dimension):
+    with Image.open(path) as image:
+        image.load()
+        return encode_smallest(image, max_dimension)
@@ -1,28 +1,41 @@
 # Python libraries
 import json
+import threading
 import time
-from pathlib import Path
+from collections import deque
 
 # Apple libraries
+import objc
 from AppKit import (
-    NSColor,
     NSEvent,
-    NSFont,
-    NSKeyDown,
-    NSMakeRect,
-    NSRoundedBezelStyle,
-    NSTextAlignmentCenter,
-    NSTextField,
-    NSView,
+    NSObject,
 )
 from Quartz import (
-    CGEventCreateKeyboardEvent,
-    CGEventKeyboardGetUnicodeString,
+    CFMachPortCreateRunLoopSource,
+    CFRunLoopAddSource,
+    CFRunLoopGetCurrent,
+    CFRunLoopRun,
+    CGEventCreateCopy,
     CGEventGetFlags,
     CGEventGetIntegerValueField,
+    CGEventGetTimestamp,
+    CGEventMaskBit,
+    CGEventPost,
+    CGEventSetIntegerValueField,
+    CGEventTapCreate,
+    CGEventTapEnable,
+    kCFRunLoopDefaultMode,
+    kCGEventFlagMaskCommand,
+    kCGEventFlagMaskControl,
+    kCGEventFlagsChanged,
     kCGEventKeyDown,
+    kCGEventSourceUserData,
+    kCGEventTapDisabledByTimeout,
+    kCGEventTapDisabledByUserInput,
+    kCGEventTapOptionDefault,
+    kCGHeadInsertEventTap,
     kCGKeyboardEventKeycode,
-    NSEvent,
+    kCGSessionEventTap,
     NSAlternateKeyMask,
     NSCommandKeyMask,
     NSControlKeyMask,
@@ -31,8 +44,29 @@ from Quartz import (
 
 
 # Local libraries
-from .constants import LAUNCHER_TRIGGER, LAUNCHER_TRIGGER_MASK
+from .apps import trigger_passes_through
+from .constants import (
+    KEYSTROKE_BUFFER_LIMIT,
+    KEYSTROKE_BUFFER_TIMEOUT,
+    LAUNCHER_TRIGGER,
+    LAUNCHER_TRIGGER_MASK,
+    RESERVED_SHORTCUTS,
+)
 from .health_checks import LOG_DIR
+from .selection import capture_selection
+from .settings import SETTINGS
+from .trigger_capture import (
+    TriggerCaptureOverlay,
+    TriggerCaptureState,
+)
+from .triggers import (
+    MATCH,
+    PARTIAL,
+    SEQUENCE_TIMEOUT,
+    TriggerRecorder,
+    compile_trigger,
+)
+from .usage import mach_time_to_seconds
 
 # File for storing the custom trigger
 TRIGGER_FILE = LOG_DIR / "custom_trigger.json"
@@ -44,116 +78,128 @@ SPECIAL_KEY_NAMES = {
     123: "Left Arrow", 124: "Right Arrow",
     125: "Down Arrow", 126: "Up Arrow"
 }
+ESCAPE_KEYCODE = 53
 handle_new_trigger = None
+# The trigger capture overlay and its state (built on first use, then reused).
+CAPTURE = {"overlay": None, "state": None}
+# The compiled state machine for the current launcher trigger.
+TRIGGER = {"machine": compile_trigger(LAUNCHER_TRIGGER)}
+# Matches found by the event tap thread, waiting to be handled on the main thread.
+# (appends and pops on a deque are atomic, so no lock is needed between the two threads)
+TRIGGER_QUEUE = deque()
+# The active event tap (kept so the tap can be re-enabled if macOS disables it).
+EVENT_TAP = {"tap": None}
+# Keys typed between a summon and the prompt receiving focus (replayed once it has focus).
+# The swallowed events are kept too, so they can be sent on if the summon does not happen.
+KEYSTROKE_BUFFER = {"deadline": 0.0, "chars": [], "events": []}
+KEYSTROKE_BUFFER_LOCK = threading.Lock()
+# Whether the overlay is the key window (set on the main thread, read on the tap thread).
+OVERLAY = {"key": False}
+DELETE_KEYCODE = 51
+# Key presses swallowed as the start of a sequence trigger. They are posted again (marked
+# so the tap lets them through) if the sequence is broken or times out.
+SWALLOWED_EVENTS = {"events": [], "timer": None}
+SWALLOWED_EVENTS_LOCK = threading.Lock()
+REPLAYED_EVENT_MARK = 0x4D474F
+
+# Replace the launcher trigger (raises KeyError or ValueError if the trigger is invalid).
+def set_launcher_trigger(launcher_trigger):
+    machine = compile_trigger(launcher_trigger)
+    LAUNCHER_TRIGGER.clear()
+    LAUNCHER_TRIGGER.update(launcher_trigger)
+    TRIGGER["machine"] = machine
 
 # Load trigger from JSON file if it exists
 def load_custom_launcher_trigger():
     if TRIGGER_FILE.exists():
         try:
             with open(TRIGGER_FILE, "r") as f:
-                data = json.load(f)
-                launcher_trigger = {"flags": data["flags"], "key": data["key"]}
+                launcher_trigger = json.load(f)
+            set_launcher_trigger(launcher_trigger)
             print(f"Overwriting default with a custom launch trigger:\n  {launcher_trigger}", flush=True)
             print(f"Disable custom override and return to default by deleting the file:\n  {TRIGGER_FILE}", flush=True)
-            LAUNCHER_TRIGGER.update(launcher_trigger)
-        except (json.JSONDecodeError, KeyError):
+        except (json.JSONDecodeError, KeyError, ValueError, TypeError, AttributeError):
             pass
 
+# Capture a new launcher trigger through the (reusable) capture overlay.
 def set_custom_launcher_trigger(app):
     app.showWindow_(None)
     print("Setting new launcher trigger.", flush=True)
-    # Disable the current trigger
-    LAUNCHER_TRIGGER["flags"] = None
-    LAUNCHER_TRIGGER["key"] = None
-    # Get the content view bounds
-    content_view = app.window.contentView()
-    content_bounds = content_view.bounds()
-    # Create the overlay view to shade the main application
-    overlay_view = NSView.alloc().initWithFrame_(content_bounds)
-    overlay_view.setWantsLayer_(True)
-    overlay_view.layer().setBackgroundColor_(NSColor.colorWithWhite_alpha_(0.0, 0.5).CGColor())  # Semi-transparent black
-    # Define container dimensions
-    container_width = 400
-    container_height = 180
-    container_x = (content_bounds.size.width - container_width) / 2
-    container_y = (content_bounds.size.height - container_height) / 2
-    container_frame = NSMakeRect(container_x, container_y, container_width, container_height)
-    container_view = NSView.alloc().initWithFrame_(container_frame)
-    container_view.setWantsLayer_(True)
-    container_view.layer().setBackgroundColor_(app.drag_area.layer().backgroundColor())  # Match app.drag_area
-    container_view.layer().setCornerRadius_(10)  # Rounded corners for overlay
-    # Define message label dimensions
-    message_label_width = container_width
-    message_label_height = 40
-    message_label_x = 0
-    message_label_y = container_height - message_label_height - 30
-    # Define minimum separation
-    min_separation = 20
-    # Define trigger display container dimensions
-    trigger_display_container_width = 280
-    trigger_display_container_height = 38
-    trigger_display_container_x = (container_width - trigger_display_container_width) / 2
-    trigger_display_container_y = message_label_y - min_separation - trigger_display_container_height
-    # Define trigger display dimensions (inside the container)
-    trigger_display_width = trigger_display_container_width
-    trigger_display_height = trigger_display_container_height  # Match container height for vertical centering
-    trigger_display_x = 0
-    trigger_display_y = -10
-    # Create the static message label
-    message_label_frame = NSMakeRect(message_label_x, message_label_y, message_label_width, message_label_height)
-    message_label = NSTextField.alloc().initWithFrame_(message_label_frame)
-    message_label.setStringValue_("Press the new trigger key combination now.")  # Static text
-    message_label.setBezeled_(False)
-    message_label.setDrawsBackground_(False)
-    message_label.setEditable_(False)
-    message_label.setSelectable_(False)
-    message_label.setAlignment_(NSTextAlignmentCenter)
-    message_label.setFont_(NSFont.boldSystemFontOfSize_(17))  # Large regular font
-    # Create the trigger display container with lighter color and rounded corners
-    trigger_display_container_frame = NSMakeRect(trigger_display_container_x, trigger_display_container_y, trigger_display_container_width, trigger_display_container_height)
-    trigger_display_container = NSView.alloc().initWithFrame_(trigger_display_container_frame)
-    trigger_display_container.setWantsLayer_(True)
-    trigger_display_container.layer().setBackgroundColor_(NSColor.lightGrayColor().CGColor())  # Lighter color
-    trigger_display_container.layer().setCornerRadius_(5)  # Rounded corners
-    # Create the trigger display inside the container
-    trigger_display_frame = NSMakeRect(trigger_display_x, trigger_display_y, trigger_display_width, trigger_display_height)
-    trigger_display = NSTextField.alloc().initWithFrame_(trigger_display_frame)
-    trigger_display.setStringValue_("Waiting for key press...")  # Initial "waiting" text
-    trigger_display.setBezeled_(False)
-    trigger_display.setDrawsBackground_(False)  # Transparent to show container's background
-    trigger_display.setEditable_(False)
-    trigger_display.setSelectable_(False)
-    trigger_display.setAlignment_(NSTextAlignmentCenter)
-    trigger_display.setFont_(NSFont.systemFontOfSize_(16))  # Large regular font
-    # Assemble the view hierarchy
-    trigger_display_container.addSubview_(trigger_display)
-    container_view.addSubview_(message_label)
-    container_view.addSubview_(trigger_display_container)
-    overlay_view.addSubview_(container_view)
-    content_view.addSubview_(overlay_view)
-    # Define the handler for the new trigger
-    def custom_handle_new_trigger(event, flags, keycode):
-        launcher_trigger = {"flags": flags, "key": keycode}
+    # The overlay views and capture state are created once and reused.
+    if CAPTURE["overlay"] is None:
+        CAPTURE["overlay"] = TriggerCaptureOverlay()
+        CAPTURE["state"] = TriggerCaptureState(RESERVED_SHORTCUTS)
+    overlay, capture = CAPTURE["overlay"], CAPTURE["state"]
+    capture.start()
+    overlay.attach(app.window.contentView())
+    overlay.update(capture)
+    # Record key presses (a combination or sequence) and modifier taps (a double tap).
+    recorder = TriggerRecorder()
+    labels = []
+    # Stop capturing (the current trigger stays active unless a new one was captured).
+    def end_capture():
+        global handle_new_trigger
+        handle_new_trigger = None
+        NSObject.cancelPreviousPerformRequestsWithTarget_selector_object_(app, "finishTriggerCapture:", None)
+        overlay.update(capture)
+        overlay.detach(1.5)
+        app.showWindow_(None)
+    # Define the handler for the events received while capturing the new trigger.
+    def custom_handle_new_trigger(kind, *args):
+        nonlocal recorder
+        launcher_trigger = None
+        if kind == "key":
+            event, flags, keycode, timestamp = args
+            if (keycode == ESCAPE_KEYCODE) and (not flags):
+                print("Cancelled setting new launcher trigger.", flush=True)
+                capture.cancel()
+                end_capture()
+                return None
+            labels.append(get_trigger_string(event, flags, keycode))
+            capture.progress(", then ".join(labels))
+            overlay.update(capture)
+            # Wait for the user to pause (or reach the step limit) before finishing a sequence.
+            NSObject.cancelPreviousPerformRequestsWithTarget_selector_object_(app, "finishTriggerCapture:", None)
+            if recorder.key_down(flags, keycode, timestamp):
+                launcher_trigger = recorder.finish()
+            else:
+                app.performSelector_withObject_afterDelay_("finishTriggerCapture:", None, SEQUENCE_TIMEOUT)
+                return None
+        elif kind == "flags":
+            flags, timestamp = args
+            launcher_trigger = recorder.flags_changed(flags, timestamp)
+            if launcher_trigger is None:
+                return None
+            labels[:] = ["Double-tap " + " + ".join(get_modifier_names(launcher_trigger["flags"]))]
+        elif kind == "finish":
+            launcher_trigger = recorder.finish()
+        if launcher_trigger is None:
+            return None
+        trigger_str = ", then ".join(labels)
+        # Start over if the trigger is already used for something else.
+        if not capture.capture(launcher_trigger, trigger_str):
+            print(f"  {capture.display}, try another.", flush=True)
+            overlay.update(capture)
+            recorder = TriggerRecorder()
+            labels.clear()
+            return None
+        set_launcher_trigger(launcher_trigger)
         with open(TRIGGER_FILE, "w") as f:
             json.dump(launcher_trigger, f)
-        LAUNCHER_TRIGGER.update(launcher_trigger)
-        trigger_str = get_trigger_string(event, flags, keycode)
         print("New launcher trigger set:", flush=True)
         print(f"  {launcher_trigger}", flush=True)
         print(f"  {trigger_str}", flush=True)
-        # Update only the trigger display, not the message label
-        trigger_display.setStringValue_(trigger_str)
-        # Remove the overlay after 3 seconds
-        overlay_view.performSelector_withObject_afterDelay_("removeFromSuperview", None, 1.5)
-        # Reset the handler
-        global handle_new_trigger
-        handle_new_trigger = None
-        app.showWindow_(None)
+        end_capture()
         return None
     # Set the global handler
     global handle_new_trigger
     handle_new_trigger = custom_handle_new_trigger
 
+# Finish capturing a new trigger after the user paused typing (called on the main thread).
+def finish_trigger_capture():
+    if handle_new_trigger:
+        handle_new_trigger("finish")
+
 # Helper function to get modifier names
 def get_modifier_names(flags):
     modifier_names = []
@@ -179,21 +225,220 @@ def get_trigger_string(event, flags, keycode):
     # Generate a plain text of the keys.
     return " + ".join(modifier_names + [key_name]) if modifier_names else key_name
 
-# Global event listener for showing/hiding the application and setting new triggers
+# Start swallowing and buffering key presses (called on the tap thread at summon).
+def begin_keystroke_capture():
+    with KEYSTROKE_BUFFER_LOCK:
+        KEYSTROKE_BUFFER["deadline"] = time.monotonic() + KEYSTROKE_BUFFER_TIMEOUT
+        KEYSTROKE_BUFFER["chars"] = []
+        KEYSTROKE_BUFFER["events"] = []
+
+# Buffer a key press if a capture is active, returns True if the event was consumed.
+def capture_keystroke(event, flags, keycode):
+    with KEYSTROKE_BUFFER_LOCK:
+        if time.monotonic() >= KEYSTROKE_BUFFER["deadline"]:
+            return False
+        chars = KEYSTROKE_BUFFER["chars"]
+        if flags & (kCGEventFlagMaskCommand | kCGEventFlagMaskControl):
+            # Shortcuts are never buffered, stop capturing and let them through.
+            KEYSTROKE_BUFFER["deadline"] = 0.0
+            return False
+        if keycode == DELETE_KEYCODE:
+            if chars:
+                chars.pop()
+            KEYSTROKE_BUFFER["events"].append(CGEventCreateCopy(event))
+            return True
+        text = NSEvent.eventWithCGEvent_(event).characters()
+        if text and text.isprintable() and (len(chars) + len(text) <= KEYSTROKE_BUFFER_LIMIT):
+            chars.append(text)
+            KEYSTROKE_BUFFER["events"].append(CGEventCreateCopy(event))
+            return True
+        # Anything else (Return, arrows, a full buffer) ends the capture.
+        KEYSTROKE_BUFFER["deadline"] = 0.0
+        return False
+
+# Stop capturing and return the buffered text (called on the main thread).
+def finish_keystroke_capture():
+    with KEYSTROKE_BUFFER_LOCK:
+        KEYSTROKE_BUFFER["deadline"] = 0.0
+        text = "".join(KEYSTROKE_BUFFER["chars"])
+        KEYSTROKE_BUFFER["chars"] = []
+        KEYSTROKE_BUFFER["events"] = []
+    return text
+
+# Stop capturing and send the buffered key presses on to the frontmost app (called on the main thread).
+def release_keystroke_capture():
+    with KEYSTROKE_BUFFER_LOCK:
+        KEYSTROKE_BUFFER["deadline"] = 0.0
+        events = KEYSTROKE_BUFFER["events"]
+        KEYSTROKE_BUFFER["chars"] = []
+        KEYSTROKE_BUFFER["events"] = []
+    post_replayed_events(events)
+
+# Record whether the overlay is the key window (called on the main thread).
+def set_overlay_key(is_key):
+    OVERLAY["key"] = is_key
+
+# Hand a matched trigger to the main thread (the tap thread must never touch the UI).
+def post_to_main_thread(app, item):
+    TRIGGER_QUEUE.append(item)
+    app.performSelectorOnMainThread_withObject_waitUntilDone_("handleTriggerQueue:", None, False)
+
+# Handle all queued trigger matches (called on the main thread).
+def drain_trigger_queue(app):
+    while TRIGGER_QUEUE:
+        item = TRIGGER_QUEUE.popleft()
+        if item[0] == "new_trigger":
+            if handle_new_trigger:
+                handle_new_trigger(*item[1:])
+        elif item[0] == "toggle":
+            if app.window.isKeyWindow():
+                # Keys typed since the trigger were meant for the app underneath.
+                app.hideWindow_(None)
+                release_keystroke_capture()
+            else:
+                app.showWindow_(None)
+
+# Hold a copy of a key press that started a sequence, replaying it if the sequence is not finished in time.
+def swallow_event(event, timeout):
+    with SWALLOWED_EVENTS_LOCK:
+        SWALLOWED_EVENTS["events"].append(CGEventCreateCopy(event))
+        if SWALLOWED_EVENTS["timer"] is not None:
+            SWALLOWED_EVENTS["timer"].cancel()
+        timer = threading.Timer(timeout, lambda: replay_swallowed_events(timer=timer))
+        timer.daemon = True
+        timer.start()
+        SWALLOWED_EVENTS["timer"] = timer
+
+# Take the swallowed key presses (and stop the replay timer), the lock must be held.
+def take_swallowed_events_locked():
+    if SWALLOWED_EVENTS["timer"] is not None:
+        SWALLOWED_EVENTS["timer"].cancel()
+        SWALLOWED_EVENTS["timer"] = None
+    events = SWALLOWED_EVENTS["events"]
+    SWALLOWED_EVENTS["events"] = []
+    return events
+
+# Take the swallowed key presses (and stop the replay timer).
+def take_swallowed_events():
+    with SWALLOWED_EVENTS_LOCK:
+        return take_swallowed_events_locked()
+
+# Post the swallowed key presses (followed by "event", if given) in their original order.
+# Returns False (posting nothing) if no key presses were swallowed. Checking, taking, and
+# posting happen under the lock, so the tap thread and the replay timer never interleave.
+# "timer" is given by the replay timer, which does nothing if it was replaced meanwhile.
+def replay_swallowed_events(event=None, timer=None):
+    with SWALLOWED_EVENTS_LOCK:
+        if (timer is not None) and (SWALLOWED_EVENTS["timer"] is not timer):
+            return False
+        events = take_swallowed_events_locked()
+        if not events:
+            return False
+        if event is not None:
+            events.append(CGEventCreateCopy(event))
+        post_replayed_events(events)
+    return True
+
+# Post copies of key presses, marked so the tap lets them through.
+def post_replayed_events(events):
+    for replayed in events:
+        CGEventSetIntegerValueField(replayed, kCGEventSourceUserData, REPLAYED_EVENT_MARK)
+        CGEventPost(kCGSessionEventTap, replayed)
+
+# Show or hide the application after the launcher trigger (called on the tap thread).
+def trigger_launcher(app):
+    # Hold keys typed before the prompt has focus, unless this trigger hides the overlay.
+    if not OVERLAY["key"]:
+        begin_keystroke_capture()
+    post_to_main_thread(app, ("toggle",))
+    if SETTINGS["prefill_selection"]:
+        capture_selection(app)
+
+# Global event listener for showing/hiding the application and setting new triggers.
+# This runs on the event tap thread, so it only matches keys and queues the result.
 def global_show_hide_listener(app):
-    def listener(proxy, event_type, event, refcon):
+    def handle_event(event_type, event):
+        # macOS disables a tap that it considers too slow, turn it back on.
+        if event_type in (kCGEventTapDisabledByTimeout, kCGEventTapDisabledByUserInput):
+            if EVENT_TAP["tap"]:
+                CGEventTapEnable(EVENT_TAP["tap"], True)
+            return event
         if event_type == kCGEventKeyDown:
+            # Key presses replayed after a broken sequence go through untouched.
+            if CGEventGetIntegerValueField(event, kCGEventSourceUserData) == REPLAYED_EVENT_MARK:
+                return event
             keycode = CGEventGetIntegerValueField(event, kCGKeyboardEventKeycode)
             flags = CGEventGetFlags(event) & LAUNCHER_TRIGGER_MASK
-            if (None in set(LAUNCHER_TRIGGER.values())) and handle_new_trigger:
-                print("  received keys, establishing new trigger..", flush=True)
-                handle_new_trigger(event, flags, keycode)
+            timestamp = mach_time_to_seconds(CGEventGetTimestamp(event))
+            if handle_new_trigger:
+                # Copy the event, the original is released once this callback returns.
+                post_to_main_thread(app, ("new_trigger", "key", CGEventCreateCopy(event), flags, keycode, timestamp))
+                return None
+            # Let keys through untouched in apps that need the trigger (games, remote desktops, ...).
+            if trigger_passes_through():
+                return event
+            machine = TRIGGER["machine"]
+            result = machine.key_down(flags, keycode, timestamp)
+            if result == MATCH:
+                take_swallowed_events()
+                trigger_launcher(app)
+                return None
+            elif result == PARTIAL:
+                # A new attempt at the sequence releases the keys of the broken one first.
+                if machine.state == 1:
+                    replay_swallowed_events()
+                swallow_event(event, machine.interval)
+                return None
+            elif replay_swallowed_events(event):
+                # The sequence was broken, its keys were sent on (in order, ahead of this one).
                 return None
-            elif (flags == LAUNCHER_TRIGGER["flags"]) and (keycode == LAUNCHER_TRIGGER["key"]):
-                if app.window.isKeyWindow():
-                    app.hideWindow_(None)
-                else:
-                    app.showWindow_(None)
+            elif capture_keystroke(event, CGEventGetFlags(event), keycode):
                 return None
+        elif event_type == kCGEventFlagsChanged:
+            # Modifier changes always pass through (swallowing them leaves keys stuck down).
+            flags = CGEventGetFlags(event) & LAUNCHER_TRIGGER_MASK
+            timestamp = mach_time_to_seconds(CGEventGetTimestamp(event))
+            if handle_new_trigger:
+                post_to_main_thread(app, ("new_trigger", "flags", flags, timestamp))
+            elif (not trigger_passes_through()) and (TRIGGER["machine"].flags_changed(flags, timestamp) == MATCH):
+                trigger_launcher(app)
         return event
+    # Objects autoreleased while handling an event (like "NSEvent.eventWithCGEvent_") are
+    # released after each event, this thread's run loop has no pool of its own.
+    def listener(proxy, event_type, event, refcon):
+        with objc.autorelease_pool():
+            return handle_event(event_type, event)
     return listener
+
+# Create the event tap on a dedicated thread with its own run loop, so that a busy
+# main thread (web view callbacks, menus, layout) never delays the launcher trigger.
+# Returns True if the tap was created successfully.
+def start_event_tap_thread(app):
+    ready = threading.Event()
+    def run():
+        tap = None
+        try:
+            with objc.autorelease_pool():
+                tap = CGEventTapCreate(
+                    kCGSessionEventTap, # Tap at the session level
+                    kCGHeadInsertEventTap, # Insert at the head of the event queue
+                    kCGEventTapOptionDefault, # Actively filter events
+                    CGEventMaskBit(kCGEventKeyDown) | CGEventMaskBit(kCGEventFlagsChanged), # Capture key-down and modifier events
+                    global_show_hide_listener(app), # Callback function
+                    None # Optional user info (refcon)
+                )
+                EVENT_TAP["tap"] = tap
+                if tap:
+                    # Integrate the tap into this thread's run loop.
+                    source = CFMachPortCreateRunLoopSource(None, tap, 0)
+                    CFRunLoopAddSource(CFRunLoopGetCurrent(), source, kCFRunLoopDefaultMode)
+                    CGEventTapEnable(tap, True)
+        finally:
+            # Never leave the main thread waiting, even if creating the tap failed.
+            ready.set()
+        if tap:
+            CFRunLoopRun() # Start the run loop (never returns)
+    thread = threading.Thread(target=run, name="EventTapThread", daemon=True)
+    thread.start()
+    ready.wait()
+    return bool(EVENT_TAP["tap"])
@@ -22,6 +22,7 @@ from .launcher import (
 from .health_checks import (
     health_check_decorator
 )
+from .memory import memory_report
 
 
 # Main executable for running the application from the command line.
@@ -43,6 +44,11 @@ def main():
         action="store_true",
         help="Check Accessibility permissions only"
     )
+    parser.add_argument(
+        "--memory-report",
+        action="store_true",
+        help="Print the recorded memory usage of the app and exit"
+    )
     args = parser.parse_args()
 
     if args.install_startup:
@@ -53,6 +59,10 @@ def main():
         uninstall_startup()
         return
 
+    if args.memory_report:
+        print("\n".join(memory_report()))
+        return
+
     if args.check_permissions:
         is_trusted = check_permissions(ask=False)
         print("Permissions granted:", is_trusted)
@@ -0,0 +1,138 @@
+# Python libraries
+import os
+import struct
+import threading
+
+# Local libraries
+from .constants import MEMORY_SAMPLE_CAPACITY
+from .health_checks import LOG_DIR
+from .usage import get_process_usage
+
+# File holding the most recent memory samples (a fixed size ring buffer).
+MEMORY_FILE = LOG_DIR / "memory_samples.bin"
+# Header is (magic, capacity, total samples written), each record is
+# (time, process role, pid, resident bytes, footprint bytes, compressed bytes or -1 if unknown).
+HEADER = struct.Struct("<4sIQ")
+RECORD = struct.Struct("<dBIQQq")
+MAGIC = b"MGO2"
+ROLES = ("overlay", "web content", "networking", "gpu")
+
+
+# A fixed size ring buffer of memory samples stored in a file, so the footprint
+# of long sessions can be inspected without the file ever growing.
+class MemoryRing:
+    def __init__(self, path=MEMORY_FILE, capacity=MEMORY_SAMPLE_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.count = 0
+        self.file = None
+        self.lock = threading.Lock()
+
+    # Open the file, starting a new buffer if it is missing or was written with another capacity.
+    # With "create" off a missing file is not created, and None is returned instead.
+    def open(self, create=True):
+        if self.file is None:
+            exists = os.path.exists(self.path)
+            if (not exists) and (not create):
+                return None
+            self.file = open(self.path, "r+b" if exists else "w+b")
+            header = self.file.read(HEADER.size)
+            if (len(header) == HEADER.size) and (HEADER.unpack(header)[:2] == (MAGIC, self.capacity)):
+                self.count = HEADER.unpack(header)[2]
+            else:
+                self.count = 0
+                self.file.seek(0)
+                self.file.truncate()
+                self.file.write(HEADER.pack(MAGIC, self.capacity, 0))
+        return self.file
+
+    # Append one sample (usage as returned by "get_process_usage").
+    def append(self, role, pid, usage):
+        with self.lock:
+            f = self.open()
+            f.seek(HEADER.size + (self.count % self.capacity) * RECORD.size)
+            compressed = usage["compressed"] if usage["compressed"] is not None else -1
+            f.write(RECORD.pack(usage["time"], ROLES.index(role), pid, usage["resident"], usage["footprint"], compressed))
+            self.count += 1
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, self.capacity, self.count))
+            f.flush()
+
+    # Read all samples (oldest first) as dictionaries.
+    def read(self):
+        with self.lock:
+            f = self.open(create=False)
+            if f is None:
+                return []
+            stored = min(self.count, self.capacity)
+            f.seek(HEADER.size)
+            data = f.read(stored * RECORD.size)
+        records = [RECORD.unpack_from(data, i * RECORD.size) for i in range(len(data) // RECORD.size)]
+        start = self.count % self.capacity if self.count > self.capacity else 0
+        records = records[start:] + records[:start]
+        return [
+            {"time": t, "role": ROLES[role], "pid": pid, "resident": resident, "footprint": footprint,
+             "compressed": compressed if compressed >= 0 else None}
+            for (t, role, pid, resident, footprint, compressed) in records
+        ]
+
+
+# Background thread that samples the memory of the overlay and its WebKit helper processes.
+# "pids" maps a role to a process ID and may be updated from the main thread. When the
+# total footprint first exceeds the budget, "app.memoryBudgetExceeded_" is called on the
+# main thread with a description.
+class MemorySampler(threading.Thread):
+    def __init__(self, app, interval, budget_mb, ring=None):
+        super().__init__(name="MemorySampler", daemon=True)
+        self.app = app
+        self.interval = interval
+        self.budget = budget_mb * 2**20
+        self.ring = ring or MemoryRing()
+        self.pids = {"overlay": os.getpid(), "web content": None, "networking": None, "gpu": None}
+        self.over_budget = False
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    # Record one sample of every known process.
+    def sample(self):
+        total = 0
+        for (role, pid) in list(self.pids.items()):
+            usage = get_process_usage(pid) if pid else None
+            if usage is None:
+                continue
+            self.ring.append(role, pid, usage)
+            total += usage["footprint"]
+        if (total > self.budget) and (not self.over_budget):
+            message = f"Memory footprint {format_bytes(total)} is above the budget of {format_bytes(self.budget)}."
+            self.app.performSelectorOnMainThread_withObject_waitUntilDone_("memoryBudgetExceeded:", message, False)
+        self.over_budget = (total > self.budget)
+
+    def stop(self):
+        self.stopped.set()
+
+
+# Format a number of bytes for reading.
+def format_bytes(size):
+    return f"{size / 2**20:.0f} MB"
+
+# Summarize the stored samples per process as lines of text.
+def memory_report(ring=None):
+    samples = (ring or MemoryRing()).read()
+    if not samples:
+        return [f"No memory samples recorded yet in:\n  {MEMORY_FILE}"]
+    first, last = samples[0]["time"], samples[-1]["time"]
+    lines = [f"Memory samples over {(last - first) / 3600:.1f} hours ({len(samples)} samples):"]
+    for role in ROLES:
+        footprints = [s["footprint"] for s in samples if s["role"] == role]
+        if not footprints:
+            continue
+        latest = [s for s in samples if s["role"] == role][-1]
+        compressed = f", {format_bytes(latest['compressed'])} compressed" if latest["compressed"] is not None else ""
+        lines.append(
+            f"  {role}: now {format_bytes(latest['footprint'])} footprint, {format_bytes(latest['resident'])} resident{compressed}"
+            f" (min {format_bytes(min(footprints))}, max {format_bytes(max(footprints))})"
+        )
+    return lines
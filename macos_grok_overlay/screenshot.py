@@ -0,0 +1,59 @@
+# Python libraries
+import base64
+import os
+import subprocess
+import tempfile
+
+# Apple libraries
+from Quartz import (
+    CGWindowListCopyWindowInfo,
+    kCGWindowLayer,
+    kCGWindowListExcludeDesktopElements,
+    kCGWindowListOptionOnScreenBelowWindow,
+    kCGWindowNumber,
+)
+
+# Local libraries
+from .imaging import get_pipeline_pool, prepare_image_file
+from .settings import SETTINGS
+
+
+# Get the ID of the topmost normal window underneath the given window (or None).
+def window_below(window_number):
+    windows = CGWindowListCopyWindowInfo(
+        kCGWindowListOptionOnScreenBelowWindow | kCGWindowListExcludeDesktopElements,
+        window_number
+    )
+    for info in windows or []:
+        if info.get(kCGWindowLayer) == 0:
+            return info.get(kCGWindowNumber)
+    return None
+
+# Run "screencapture" for a region (window_id=None) or a window, returns a data URL (or None).
+def capture_data_url(window_id=None):
+    handle, path = tempfile.mkstemp(prefix="macos-grok-overlay-", suffix=".png")
+    os.close(handle)
+    try:
+        if window_id is None:
+            command = ["screencapture", "-i", "-x", "-t", "png", path] # Interactive selection
+        else:
+            command = ["screencapture", "-x", "-o", "-t", "png", "-l", str(window_id), path]
+        subprocess.run(command, check=False)
+        # Nothing is written when the selection is cancelled.
+        if os.path.getsize(path) == 0:
+            return None
+        mime_type, data = prepare_image_file(path, SETTINGS["screenshot_max_dimension"])
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+    finally:
+        os.remove(path)
+
+# Capture a screenshot off the main thread and pass it to "app.attachImage_" when done.
+def capture_to_prompt(app, window_id=None):
+    def run():
+        try:
+            data_url = capture_data_url(window_id)
+        except Exception as e:
+            print(f"Screenshot failed: {e}", flush=True)
+            data_url = None
+        app.performSelectorOnMainThread_withObject_waitUntilDone_("attachImage:", data_url, False)
+    get_pipeline_pool().submit(run)
@@ -0,0 +1,56 @@
+# Python libraries
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Apple libraries
+import objc
+from ApplicationServices import (
+    AXUIElementCopyAttributeValue,
+    AXUIElementCreateApplication,
+    AXUIElementSetMessagingTimeout,
+    kAXErrorSuccess,
+    kAXFocusedUIElementAttribute,
+    kAXSelectedTextAttribute,
+)
+
+# Local libraries
+from .apps import FRONTMOST_APP
+from .constants import SELECTION_PREFILL_DEADLINE
+
+# Single worker for reading the selection, so a summon never waits on another app.
+SELECTION_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="SelectionCapture")
+
+
+# Read an attribute of an accessibility element (returns None on any error).
+def get_attribute(element, attribute, timeout):
+    AXUIElementSetMessagingTimeout(element, timeout)
+    error, value = AXUIElementCopyAttributeValue(element, attribute, None)
+    return value if error == kAXErrorSuccess else None
+
+# Get the selected text in the focused element of an application (or None).
+def get_selected_text(pid, timeout):
+    application = AXUIElementCreateApplication(pid)
+    element = get_attribute(application, kAXFocusedUIElementAttribute, timeout)
+    if element is None:
+        return None
+    text = get_attribute(element, kAXSelectedTextAttribute, timeout)
+    return str(text) if text else None
+
+# Read the frontmost application's selected text concurrently with the summon, and pass it
+# to "app.prefillSelection_" only if it arrived before the deadline (called on the tap thread).
+def capture_selection(app):
+    started = time.monotonic()
+    # Take the frontmost app now, before the overlay activates and takes its place.
+    pid = FRONTMOST_APP["pid"]
+    if (pid is None) or (pid == os.getpid()):
+        return
+    def run():
+        remaining = SELECTION_PREFILL_DEADLINE - (time.monotonic() - started)
+        if remaining <= 0:
+            return
+        with objc.autorelease_pool():
+            text = get_selected_text(pid, remaining)
+        if text and (time.monotonic() - started <= SELECTION_PREFILL_DEADLINE):
+            app.performSelectorOnMainThread_withObject_waitUntilDone_("prefillSelection:", text, False)
+    SELECTION_POOL.submit(run)
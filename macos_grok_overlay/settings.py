@@ -0,0 +1,44 @@
+# Python libraries
+import json
+from pathlib import Path
+
+# Local libraries
+from .constants import (
+    MEMORY_BUDGET_MB,
+    MEMORY_SAMPLE_INTERVAL,
+    SCREENSHOT_MAX_DIMENSION,
+)
+from .health_checks import LOG_DIR
+
+# File for storing user settings (any setting missing from the file keeps its default).
+SETTINGS_FILE = LOG_DIR / "settings.json"
+# File for the snippet library, a JSON object of {abbreviation: prompt template}.
+SNIPPETS_FILE = LOG_DIR / "snippets.json"
+SETTINGS = {
+    "screenshot_max_dimension": SCREENSHOT_MAX_DIMENSION,
+    "prefill_selection": False,
+    "export_conversations": False,
+    "export_dir": str(Path.home() / "Documents" / "Grok Conversations"),
+    "follow_cursor_display": False,
+    "display_frames": {}, # Display number (as a string) -> last window frame on that display.
+    "hotkey_app_mode": "deny", # "deny" or "allow", see "hotkey_app_bundle_ids".
+    "hotkey_app_bundle_ids": [], # Apps where the launcher trigger is (deny) or is not (allow) passed through.
+    "memory_sample_interval": MEMORY_SAMPLE_INTERVAL, # Seconds, 0 disables sampling.
+    "memory_budget_mb": MEMORY_BUDGET_MB,
+}
+
+# Load settings from JSON file if it exists.
+def load_settings():
+    if SETTINGS_FILE.exists():
+        try:
+            with open(SETTINGS_FILE, "r") as f:
+                data = json.load(f)
+            SETTINGS.update({k: v for (k, v) in data.items() if k in SETTINGS})
+            print(f"Loaded settings from:\n  {SETTINGS_FILE}", flush=True)
+        except (json.JSONDecodeError, AttributeError):
+            print(f"Ignoring unreadable settings file:\n  {SETTINGS_FILE}", flush=True)
+
+# Save the current settings to the JSON file.
+def save_settings():
+    with open(SETTINGS_FILE, "w") as f:
+        json.dump(SETTINGS, f, indent=2)
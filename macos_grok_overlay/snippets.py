@@ -0,0 +1,118 @@
+# Python libraries
+import json
+import os
+
+
+# Prefix tree of snippet abbreviations. Nodes are dictionaries from a character to the
+# child node, with the template of a complete abbreviation stored under the key None.
+# A cursor follows the word being typed one character at a time, so each keystroke is a
+# single dictionary lookup regardless of how many snippets are in the library.
+class SnippetTrie:
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+        self.reset()
+
+    # Add (or replace) a snippet.
+    def insert(self, abbreviation, template):
+        node = self.root
+        for char in abbreviation:
+            node = node.setdefault(char, {})
+        if None not in node:
+            self.size += 1
+        node[None] = template
+
+    # Remove a snippet (if it exists), pruning nodes that are no longer needed.
+    def remove(self, abbreviation):
+        path = [self.root]
+        for char in abbreviation:
+            node = path[-1].get(char)
+            if node is None:
+                return
+            path.append(node)
+        if path[-1].pop(None, None) is None:
+            return
+        self.size -= 1
+        for depth in range(len(abbreviation), 0, -1):
+            if path[depth]:
+                break
+            path[depth - 1].pop(abbreviation[depth - 1])
+        # The cursor may point into a removed branch.
+        self.reset()
+
+    # Get the template for an abbreviation (or None).
+    def get(self, abbreviation):
+        node = self.root
+        for char in abbreviation:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node.get(None)
+
+    # Move the cursor back to the start of a word.
+    def reset(self):
+        self.path = [self.root]
+        self.chars = []
+
+    # Advance the cursor by one typed character, returns the template if the word is now an abbreviation.
+    def step(self, char):
+        node = self.path[-1]
+        node = node.get(char) if node is not None else None
+        self.path.append(node)
+        self.chars.append(char)
+        return node.get(None) if node is not None else None
+
+    # Move the cursor back by one character (for a deletion), returns the template if the word is an abbreviation.
+    def back(self):
+        if len(self.path) > 1:
+            self.path.pop()
+            self.chars.pop()
+        else:
+            # Deleted into an earlier word that was not followed, no match until the next reset.
+            self.path.append(None)
+            self.chars.append("")
+        node = self.path[-1]
+        return node.get(None) if (node is not None) and (len(self.path) > 1) else None
+
+    # The length of the word under the cursor.
+    def depth(self):
+        return len(self.path) - 1
+
+    # The word under the cursor (only meaningful when it matched an abbreviation).
+    def word(self):
+        return "".join(self.chars)
+
+
+# A snippet library stored as a JSON object of {abbreviation: template}. The trie is built
+# once and, when the file changes, only the added, changed, and removed snippets are applied.
+class SnippetLibrary:
+    def __init__(self, path):
+        self.path = path
+        self.trie = SnippetTrie()
+        self.snippets = {}
+        self.mtime = None
+
+    # Reload the library if the file changed since the last call, returns True if it changed.
+    def refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        snippets = {}
+        if mtime is not None:
+            try:
+                with open(self.path, "r") as f:
+                    snippets = {str(k): str(v) for (k, v) in json.load(f).items() if k}
+            except (json.JSONDecodeError, AttributeError, OSError):
+                print(f"Ignoring unreadable snippet library:\n  {self.path}", flush=True)
+                return False
+        for abbreviation in self.snippets.keys() - snippets.keys():
+            self.trie.remove(abbreviation)
+        for (abbreviation, template) in snippets.items():
+            if self.snippets.get(abbreviation) != template:
+                self.trie.insert(abbreviation, template)
+        self.snippets = snippets
+        return True
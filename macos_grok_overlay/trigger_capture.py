@@ -0,0 +1,181 @@
+# Apple libraries
+from AppKit import (
+    NSColor,
+    NSFont,
+    NSMakeRect,
+    NSObject,
+    NSTextAlignmentCenter,
+    NSTextField,
+    NSView,
+    NSViewHeightSizable,
+    NSViewMaxXMargin,
+    NSViewMaxYMargin,
+    NSViewMinXMargin,
+    NSViewMinYMargin,
+    NSViewWidthSizable,
+)
+
+# States of a trigger capture.
+IDLE = "idle"
+WAITING = "waiting"
+CAPTURED = "captured"
+CONFLICT = "conflict"
+CANCELLED = "cancelled"
+# Text shown for each state (the captured trigger is shown in the display).
+STATE_MESSAGES = {
+    WAITING: "Press a new shortcut, sequence, or double-tap.",
+    CAPTURED: "New shortcut saved.",
+    CONFLICT: "That shortcut is taken, try another.",
+    CANCELLED: "Shortcut unchanged.",
+}
+HINT_TEXT = "Press Escape to cancel."
+
+
+# Get the description of the binding that a trigger conflicts with (or None). Only the
+# first step of a trigger can conflict, modifier double taps never do.
+def find_conflict(trigger, bindings):
+    if trigger.get("type") == "double_tap":
+        return None
+    first = trigger["steps"][0] if trigger.get("type") == "sequence" else trigger
+    for (flags, keycode, description) in bindings:
+        if (first["flags"] == flags) and (first["key"] == keycode):
+            return description
+    return None
+
+
+# The state of capturing a new trigger: WAITING until a trigger is captured (CAPTURED),
+# rejected for matching an existing binding (CONFLICT, still waiting for another), or the
+# capture is cancelled (CANCELLED). "display" is the text describing the keys pressed.
+class TriggerCaptureState:
+    def __init__(self, bindings):
+        self.bindings = bindings
+        self.state = IDLE
+        self.trigger = None
+        self.display = ""
+
+    # Check whether keys are still being captured.
+    def active(self):
+        return self.state in (WAITING, CONFLICT)
+
+    # Begin a new capture.
+    def start(self):
+        self.state = WAITING
+        self.trigger = None
+        self.display = "Waiting for key press..."
+
+    # Show the keys pressed so far (the trigger is not complete yet).
+    def progress(self, display):
+        if self.active():
+            self.display = display
+
+    # Offer a complete trigger, returns True if it was accepted.
+    def capture(self, trigger, display):
+        if not self.active():
+            return False
+        self.display = display
+        conflict = find_conflict(trigger, self.bindings)
+        if conflict is not None:
+            self.state = CONFLICT
+            self.display = f"{display} is used by {conflict}"
+            return False
+        self.state = CAPTURED
+        self.trigger = trigger
+        return True
+
+    # Stop capturing without changing the trigger.
+    def cancel(self):
+        if self.active():
+            self.state = CANCELLED
+            self.display = "Cancelled"
+
+    # The message for the current state.
+    def message(self):
+        return STATE_MESSAGES.get(self.state, "")
+
+
+# The overlay shown while capturing a trigger. The views are built once (on first use),
+# attached to a content view for each capture, and kept centered by autoresizing masks.
+class TriggerCaptureOverlay:
+    WIDTH = 400
+    HEIGHT = 180
+    DISPLAY_WIDTH = 280
+    DISPLAY_HEIGHT = 38
+
+    def __init__(self):
+        self.view = None
+
+    # Create a non-editable label.
+    @staticmethod
+    def label(frame, font):
+        field = NSTextField.alloc().initWithFrame_(frame)
+        field.setBezeled_(False)
+        field.setDrawsBackground_(False)
+        field.setEditable_(False)
+        field.setSelectable_(False)
+        field.setAlignment_(NSTextAlignmentCenter)
+        field.setFont_(font)
+        return field
+
+    # Build the view tree (only done once).
+    def build(self):
+        width, height = self.WIDTH, self.HEIGHT
+        # Overlay to shade the main application.
+        self.view = NSView.alloc().initWithFrame_(NSMakeRect(0, 0, width, height))
+        self.view.setWantsLayer_(True)
+        self.view.layer().setBackgroundColor_(NSColor.colorWithWhite_alpha_(0.0, 0.5).CGColor())
+        self.view.setAutoresizingMask_(NSViewWidthSizable | NSViewHeightSizable)
+        # Centered container with rounded corners (stays centered through resizes).
+        self.container = NSView.alloc().initWithFrame_(NSMakeRect(0, 0, width, height))
+        self.container.setWantsLayer_(True)
+        self.container.layer().setBackgroundColor_(NSColor.windowBackgroundColor().CGColor())
+        self.container.layer().setCornerRadius_(10)
+        self.container.setAutoresizingMask_(NSViewMinXMargin | NSViewMaxXMargin | NSViewMinYMargin | NSViewMaxYMargin)
+        # Message describing the state of the capture.
+        self.message_label = self.label(NSMakeRect(0, height - 70, width, 40), NSFont.boldSystemFontOfSize_(17))
+        # Display of the captured keys, inside a lighter box with rounded corners.
+        display_x = (width - self.DISPLAY_WIDTH) / 2
+        display_y = height - 70 - 20 - self.DISPLAY_HEIGHT
+        display_box = NSView.alloc().initWithFrame_(NSMakeRect(display_x, display_y, self.DISPLAY_WIDTH, self.DISPLAY_HEIGHT))
+        display_box.setWantsLayer_(True)
+        display_box.layer().setBackgroundColor_(NSColor.lightGrayColor().CGColor())
+        display_box.layer().setCornerRadius_(5)
+        self.display_label = self.label(NSMakeRect(0, -10, self.DISPLAY_WIDTH, self.DISPLAY_HEIGHT), NSFont.systemFontOfSize_(16))
+        # Hint for how to cancel.
+        self.hint_label = self.label(NSMakeRect(0, 12, width, 24), NSFont.systemFontOfSize_(12))
+        self.hint_label.setStringValue_(HINT_TEXT)
+        # Assemble the view hierarchy.
+        display_box.addSubview_(self.display_label)
+        self.container.addSubview_(self.message_label)
+        self.container.addSubview_(display_box)
+        self.container.addSubview_(self.hint_label)
+        self.view.addSubview_(self.container)
+
+    # Place the overlay over a content view (building it on first use).
+    def attach(self, content_view):
+        if self.view is None:
+            self.build()
+        # Cancel a removal still pending from the previous capture.
+        NSObject.cancelPreviousPerformRequestsWithTarget_(self.view)
+        if self.view.superview() is not None:
+            self.view.removeFromSuperview()
+        self.layout(content_view.bounds())
+        content_view.addSubview_(self.view)
+
+    # Size the overlay to the given bounds and center the container.
+    def layout(self, bounds):
+        width, height = bounds.size.width, bounds.size.height
+        self.view.setFrame_(bounds)
+        self.container.setFrame_(NSMakeRect(
+            (width - self.WIDTH) / 2, (height - self.HEIGHT) / 2, self.WIDTH, self.HEIGHT
+        ))
+
+    # Show the current state of a capture.
+    def update(self, capture):
+        self.message_label.setStringValue_(capture.message())
+        self.display_label.setStringValue_(capture.display)
+        self.hint_label.setHidden_(not capture.active())
+
+    # Remove the overlay after a delay (seconds).
+    def detach(self, delay=0.0):
+        if (self.view is not None) and (self.view.superview() is not None):
+            self.view.performSelector_withObject_afterDelay_("removeFromSuperview", None, delay)
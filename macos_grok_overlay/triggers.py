@@ -0,0 +1,153 @@
+# Launcher trigger engine. A trigger is described by a dictionary (as saved in the custom
+# trigger file) and compiled into a TriggerMachine, a small timing state machine that is
+# fed key-down and flags-changed events. Every event is handled in constant time using only
+# the machine's fixed fields. Flags given to the machine must already be masked to the
+# modifier keys (see LAUNCHER_TRIGGER_MASK), and timestamps are in seconds.
+#
+#   {"flags": F, "key": K}                                   - press key K while holding modifiers F
+#   {"type": "double_tap", "flags": F}                       - tap the modifiers F twice
+#   {"type": "sequence", "steps": [{"flags": F, "key": K}, ...]} - press each combination in order
+
+# Results of feeding an event to a TriggerMachine.
+NO_MATCH = 0
+PARTIAL = 1 # Part of a sequence, the event should be swallowed.
+MATCH = 2
+# Default timing limits (seconds).
+DOUBLE_TAP_INTERVAL = 0.35 # Maximum time between releasing the first tap and pressing the second.
+SEQUENCE_TIMEOUT = 1.0 # Maximum time between the steps of a sequence.
+
+COMBO = "combo"
+DOUBLE_TAP = "double_tap"
+SEQUENCE = "sequence"
+
+
+# Timing state machine for one trigger (build with "compile_trigger").
+class TriggerMachine:
+    __slots__ = ("kind", "flags", "key", "step_flags", "step_keys", "length", "interval", "state", "last_time")
+
+    def __init__(self, kind, step_flags, step_keys, interval):
+        self.kind = kind
+        self.step_flags = tuple(step_flags)
+        self.step_keys = tuple(step_keys)
+        self.length = len(self.step_flags)
+        self.flags = self.step_flags[0]
+        self.key = self.step_keys[0]
+        self.interval = interval
+        self.reset()
+
+    # Forget any partially matched trigger.
+    def reset(self):
+        self.state = 0
+        self.last_time = 0.0
+
+    # Handle a key-down event, returns NO_MATCH, PARTIAL, or MATCH.
+    def key_down(self, flags, keycode, timestamp):
+        kind = self.kind
+        if kind is COMBO:
+            return MATCH if (flags == self.flags) and (keycode == self.key) else NO_MATCH
+        if kind is DOUBLE_TAP:
+            # Any key press between taps means the modifier is being used for something else.
+            self.state = 0
+            return NO_MATCH
+        # Sequence.
+        state = self.state
+        if (state > 0) and (timestamp - self.last_time > self.interval):
+            state = 0
+        if (flags == self.step_flags[state]) and (keycode == self.step_keys[state]):
+            state += 1
+            self.last_time = timestamp
+            if state == self.length:
+                self.state = 0
+                return MATCH
+            self.state = state
+            return PARTIAL
+        # A wrong step may still be the start of a new attempt.
+        if (state > 0) and (flags == self.step_flags[0]) and (keycode == self.step_keys[0]):
+            self.state = 1
+            self.last_time = timestamp
+            return PARTIAL
+        self.state = 0
+        return NO_MATCH
+
+    # Handle a flags-changed event (modifier pressed or released), returns NO_MATCH or MATCH.
+    #  Double-tap states: 0 idle, 1 first tap held, 2 first tap released.
+    def flags_changed(self, flags, timestamp):
+        if self.kind is not DOUBLE_TAP:
+            return NO_MATCH
+        state = self.state
+        if flags == self.flags:
+            if (state == 2) and (timestamp - self.last_time <= self.interval):
+                self.state = 0
+                return MATCH
+            self.state = 1
+            self.last_time = timestamp
+        elif (flags == 0) and (state == 1):
+            self.state = 2
+            self.last_time = timestamp
+        else:
+            self.state = 0
+        return NO_MATCH
+
+
+# Compile a trigger dictionary into a TriggerMachine (raises KeyError or ValueError if invalid).
+def compile_trigger(trigger):
+    kind = trigger.get("type", COMBO)
+    if kind == COMBO:
+        return TriggerMachine(COMBO, [trigger["flags"]], [trigger["key"]], 0.0)
+    elif kind == DOUBLE_TAP:
+        if not trigger["flags"]:
+            raise ValueError("A double tap trigger requires at least one modifier key.")
+        return TriggerMachine(DOUBLE_TAP, [trigger["flags"]], [None], trigger.get("interval", DOUBLE_TAP_INTERVAL))
+    elif kind == SEQUENCE:
+        steps = trigger["steps"]
+        if len(steps) < 2:
+            raise ValueError("A sequence trigger requires at least two steps.")
+        return TriggerMachine(
+            SEQUENCE,
+            [step["flags"] for step in steps],
+            [step["key"] for step in steps],
+            trigger.get("timeout", SEQUENCE_TIMEOUT),
+        )
+    raise ValueError(f"Unknown trigger type {repr(kind)}.")
+
+
+# Records a new trigger from the events typed while capturing. Key presses become steps
+# (one step is a combination, more are a sequence), and tapping the same modifiers twice
+# without pressing a key is a double tap. Call "finish" once the user pauses typing.
+class TriggerRecorder:
+    def __init__(self, max_steps=3):
+        self.max_steps = max_steps
+        self.steps = []
+        self.modifiers = 0
+        self.taps = 0
+        self.last_release = 0.0
+
+    # Record a key-down event, returns True once no more steps can be added.
+    def key_down(self, flags, keycode, timestamp):
+        self.taps = 0
+        self.modifiers = 0
+        self.steps.append({"flags": flags, "key": keycode})
+        return len(self.steps) >= self.max_steps
+
+    # Record a flags-changed event, returns a double tap trigger once one is complete (otherwise None).
+    def flags_changed(self, flags, timestamp):
+        if self.steps:
+            return None
+        if flags:
+            if (flags != self.modifiers) or (timestamp - self.last_release > DOUBLE_TAP_INTERVAL):
+                self.taps = 0
+            self.modifiers = flags
+        elif self.modifiers:
+            self.taps += 1
+            self.last_release = timestamp
+            if self.taps == 2:
+                return {"type": DOUBLE_TAP, "flags": self.modifiers}
+        return None
+
+    # Get the recorded trigger (or None if no key was pressed).
+    def finish(self):
+        if not self.steps:
+            return None
+        elif len(self.steps) == 1:
+            return dict(self.steps[0])
+        return {"type": SEQUENCE, "steps": [dict(step) for step in self.steps]}
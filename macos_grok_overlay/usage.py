@@ -0,0 +1,125 @@
+# Python libraries
+import ctypes
+import os
+import time
+
+
+# Layout of "struct rusage_info_v2" from <sys/resource.h>.
+class RUsageInfoV2(ctypes.Structure):
+    _fields_ = [
+        ("ri_uuid", ctypes.c_uint8 * 16),
+        ("ri_user_time", ctypes.c_uint64),
+        ("ri_system_time", ctypes.c_uint64),
+        ("ri_pkg_idle_wkups", ctypes.c_uint64),
+        ("ri_interrupt_wkups", ctypes.c_uint64),
+        ("ri_pageins", ctypes.c_uint64),
+        ("ri_wired_size", ctypes.c_uint64),
+        ("ri_resident_size", ctypes.c_uint64),
+        ("ri_phys_footprint", ctypes.c_uint64),
+        ("ri_proc_start_abstime", ctypes.c_uint64),
+        ("ri_proc_exit_abstime", ctypes.c_uint64),
+        ("ri_child_user_time", ctypes.c_uint64),
+        ("ri_child_system_time", ctypes.c_uint64),
+        ("ri_child_pkg_idle_wkups", ctypes.c_uint64),
+        ("ri_child_interrupt_wkups", ctypes.c_uint64),
+        ("ri_child_pageins", ctypes.c_uint64),
+        ("ri_child_elapsed_abstime", ctypes.c_uint64),
+        ("ri_diskio_bytesread", ctypes.c_uint64),
+        ("ri_diskio_byteswritten", ctypes.c_uint64),
+    ]
+
+# Layout of "struct mach_timebase_info" (converts mach time units to nanoseconds).
+class MachTimebaseInfo(ctypes.Structure):
+    _fields_ = [("numer", ctypes.c_uint32), ("denom", ctypes.c_uint32)]
+
+# Leading fields of "struct task_vm_info" from <mach/task_info.h> (up to "phys_footprint",
+# the kernel fills in as many fields as the count passed to "task_info" asks for).
+class TaskVMInfo(ctypes.Structure):
+    _pack_ = 4
+    _fields_ = [
+        ("virtual_size", ctypes.c_uint64),
+        ("region_count", ctypes.c_int32),
+        ("page_size", ctypes.c_int32),
+        ("resident_size", ctypes.c_uint64),
+        ("resident_size_peak", ctypes.c_uint64),
+        ("device", ctypes.c_uint64),
+        ("device_peak", ctypes.c_uint64),
+        ("internal", ctypes.c_uint64),
+        ("internal_peak", ctypes.c_uint64),
+        ("external", ctypes.c_uint64),
+        ("external_peak", ctypes.c_uint64),
+        ("reusable", ctypes.c_uint64),
+        ("reusable_peak", ctypes.c_uint64),
+        ("purgeable_volatile_pmap", ctypes.c_uint64),
+        ("purgeable_volatile_resident", ctypes.c_uint64),
+        ("purgeable_volatile_virtual", ctypes.c_uint64),
+        ("compressed", ctypes.c_uint64),
+        ("compressed_peak", ctypes.c_uint64),
+        ("compressed_lifetime", ctypes.c_uint64),
+        ("phys_footprint", ctypes.c_uint64),
+    ]
+
+RUSAGE_INFO_V2 = 2
+TASK_VM_INFO = 22
+# The system library and time base are loaded on first use.
+LIBSYSTEM = {"lib": None, "ns_per_tick": 1.0}
+
+
+# Load the system library that provides "proc_pid_rusage".
+def get_libsystem():
+    if LIBSYSTEM["lib"] is None:
+        lib = ctypes.CDLL("/usr/lib/libSystem.B.dylib", use_errno=True)
+        lib.proc_pid_rusage.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.POINTER(RUsageInfoV2)]
+        lib.proc_pid_rusage.restype = ctypes.c_int
+        lib.task_info.argtypes = [ctypes.c_uint, ctypes.c_int, ctypes.POINTER(TaskVMInfo), ctypes.POINTER(ctypes.c_uint)]
+        lib.task_info.restype = ctypes.c_int
+        timebase = MachTimebaseInfo()
+        lib.mach_timebase_info(ctypes.byref(timebase))
+        LIBSYSTEM["ns_per_tick"] = timebase.numer / timebase.denom
+        LIBSYSTEM["lib"] = lib
+    return LIBSYSTEM["lib"]
+
+# Convert a mach absolute time (as used by process start times and event timestamps) to seconds.
+def mach_time_to_seconds(ticks):
+    get_libsystem()
+    return ticks * LIBSYSTEM["ns_per_tick"] / 1e9
+
+# Get the compressed memory size of this process (bytes, or None if it cannot be read).
+# Other processes (like the WebKit helpers) would need their task port, which macOS
+# only hands out to privileged processes, so their compressed size is not available.
+def get_compressed_size():
+    lib = get_libsystem()
+    info = TaskVMInfo()
+    count = ctypes.c_uint(ctypes.sizeof(TaskVMInfo) // 4)
+    task = ctypes.c_uint.in_dll(lib, "mach_task_self_")
+    if lib.task_info(task, TASK_VM_INFO, ctypes.byref(info), ctypes.byref(count)) != 0:
+        return None
+    return info.compressed
+
+# Get resource usage of a process as a dictionary (or None if it cannot be read):
+#   "time"       - wall clock time of the sample (seconds)
+#   "cpu"        - total user + system CPU time (seconds)
+#   "wakeups"    - total idle and interrupt wakeups
+#   "resident"   - resident memory size (bytes)
+#   "footprint"  - physical footprint, including compressed memory (bytes)
+#   "compressed" - compressed memory size (bytes, None for processes other than this one)
+def get_process_usage(pid):
+    lib = get_libsystem()
+    info = RUsageInfoV2()
+    if lib.proc_pid_rusage(pid, RUSAGE_INFO_V2, ctypes.byref(info)) != 0:
+        return None
+    return {
+        "time": time.time(),
+        "cpu": (info.ri_user_time + info.ri_system_time) * LIBSYSTEM["ns_per_tick"] / 1e9,
+        "wakeups": info.ri_pkg_idle_wkups + info.ri_interrupt_wkups,
+        "resident": info.ri_resident_size,
+        "footprint": info.ri_phys_footprint,
+        "compressed": get_compressed_size() if pid == os.getpid() else None,
+    }
+
+# Get the change in CPU time and wakeups between two usage samples, as a readable string.
+def describe_usage_change(before, after):
+    cpu = after["cpu"] - before["cpu"]
+    wakeups = after["wakeups"] - before["wakeups"]
+    elapsed = max(after["time"] - before["time"], 1e-9)
+    return f"CPU {cpu:.2f}s ({100 * cpu / elapsed:.2f}%), {wakeups} wakeups ({wakeups / elapsed:.1f}/s)"
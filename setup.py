@@ -75,7 +75,7 @@ if __name__ == "__main__":
                         'CFBundleIdentifier': f'com.github-{git_username}.macos{source_page}overlay',  # Unique identifier
                         'LSUIElement': True,  # Hide from Dock and Cmd+Tab
                     },
-                    'includes': ['pyobjc'],  # Ensure required dependencies are bundled
+                    'includes': ['pyobjc', 'PIL'],  # Ensure required dependencies are bundled
                     'packages': [package],
                     'resources': [
                         f"{package}/logo/logo_white.png",
@@ -0,0 +1,118 @@
+# Drive the trigger capture state and overlay headless. AppKit and Quartz are replaced
+# with mocks while "trigger_capture.py" and "constants.py" are loaded from their files
+# (importing the package would start the app).
+import importlib.util
+import os
+import sys
+from unittest import mock
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "macos_grok_overlay")
+# Modifier flags (same values as the Quartz event flag masks).
+SHIFT = 0x20000
+CONTROL = 0x40000
+OPTION = 0x80000
+COMMAND = 0x100000
+# Key codes.
+SPACE, A, C, K, G = 49, 0, 8, 40, 5
+
+
+# Load a module of the package from its file.
+def load(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(PACKAGE_DIR, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+APPKIT = mock.MagicMock(name="AppKit")
+QUARTZ = mock.MagicMock(
+    name="Quartz",
+    kCGEventFlagMaskShift=SHIFT,
+    kCGEventFlagMaskControl=CONTROL,
+    kCGEventFlagMaskAlternate=OPTION,
+    kCGEventFlagMaskCommand=COMMAND,
+)
+with mock.patch.dict(sys.modules, {"AppKit": APPKIT, "Quartz": QUARTZ}):
+    trigger_capture = load("trigger_capture")
+    constants = load("constants")
+
+
+def test_capture_accepted():
+    capture = trigger_capture.TriggerCaptureState(constants.RESERVED_SHORTCUTS)
+    assert capture.state == trigger_capture.IDLE
+    capture.start()
+    assert capture.state == trigger_capture.WAITING
+    assert capture.active()
+    capture.progress("Option + Space")
+    assert capture.display == "Option + Space"
+    trigger = {"flags": OPTION, "key": SPACE}
+    assert capture.capture(trigger, "Option + Space") is True
+    assert capture.state == trigger_capture.CAPTURED
+    assert capture.trigger == trigger
+    assert not capture.active()
+
+
+def test_capture_conflict_then_retry():
+    capture = trigger_capture.TriggerCaptureState(constants.RESERVED_SHORTCUTS)
+    capture.start()
+    assert capture.capture({"flags": COMMAND, "key": C}, "Command + c") is False
+    assert capture.state == trigger_capture.CONFLICT
+    assert capture.display == "Command + c is used by Copy"
+    assert capture.trigger is None
+    # Still capturing, another trigger can be offered.
+    assert capture.active()
+    assert capture.capture({"flags": CONTROL, "key": K}, "Control + k") is True
+    assert capture.state == trigger_capture.CAPTURED
+
+
+def test_capture_cancel():
+    capture = trigger_capture.TriggerCaptureState(constants.RESERVED_SHORTCUTS)
+    capture.start()
+    capture.cancel()
+    assert capture.state == trigger_capture.CANCELLED
+    assert capture.display == "Cancelled"
+    assert capture.message() == trigger_capture.STATE_MESSAGES[trigger_capture.CANCELLED]
+    assert capture.trigger is None
+
+
+def test_inactive_capture_ignores_input():
+    capture = trigger_capture.TriggerCaptureState(constants.RESERVED_SHORTCUTS)
+    assert capture.capture({"flags": OPTION, "key": SPACE}, "Option + Space") is False
+    assert capture.state == trigger_capture.IDLE
+    capture.start()
+    capture.cancel()
+    assert capture.capture({"flags": OPTION, "key": SPACE}, "Option + Space") is False
+    capture.progress("Option")
+    assert capture.state == trigger_capture.CANCELLED
+    assert capture.display == "Cancelled"
+
+
+def test_find_conflict():
+    bindings = constants.RESERVED_SHORTCUTS
+    assert trigger_capture.find_conflict({"flags": COMMAND, "key": A}, bindings) == "Select All"
+    assert trigger_capture.find_conflict({"flags": OPTION, "key": SPACE}, bindings) is None
+    # Only the first step of a sequence can conflict.
+    sequence = {"type": "sequence", "steps": [{"flags": COMMAND, "key": C}, {"flags": 0, "key": G}]}
+    assert trigger_capture.find_conflict(sequence, bindings) == "Copy"
+    sequence = {"type": "sequence", "steps": [{"flags": CONTROL, "key": K}, {"flags": COMMAND, "key": C}]}
+    assert trigger_capture.find_conflict(sequence, bindings) is None
+    # Modifier double taps never conflict.
+    assert trigger_capture.find_conflict({"type": "double_tap", "flags": COMMAND}, bindings) is None
+
+
+def test_overlay_built_once():
+    APPKIT.reset_mock()
+    overlay = trigger_capture.TriggerCaptureOverlay()
+    content_view = mock.MagicMock(name="content_view")
+    overlay.attach(content_view)
+    view = overlay.view
+    built = (APPKIT.NSView.alloc.call_count, APPKIT.NSTextField.alloc.call_count)
+    assert built[0] > 0
+    capture = trigger_capture.TriggerCaptureState(constants.RESERVED_SHORTCUTS)
+    capture.start()
+    overlay.update(capture)
+    overlay.detach(1.5)
+    overlay.attach(content_view)
+    # The second capture reuses the same views.
+    assert overlay.view is view
+    assert (APPKIT.NSView.alloc.call_count, APPKIT.NSTextField.alloc.call_count) == built
+    assert content_view.addSubview_.call_count == 2
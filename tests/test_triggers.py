@@ -0,0 +1,180 @@
+# Drive the trigger state machines with synthetic, timestamped event streams.
+# "triggers.py" has no Apple dependencies, so it is loaded directly from its file
+# (importing the package would import AppKit).
+import importlib.util
+import os
+
+import pytest
+
+TRIGGERS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "macos_grok_overlay", "triggers.py")
+spec = importlib.util.spec_from_file_location("triggers", TRIGGERS_PATH)
+triggers = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(triggers)
+
+# Modifier flags (same values as the Quartz event flag masks).
+SHIFT = 0x20000
+CONTROL = 0x40000
+OPTION = 0x80000
+COMMAND = 0x100000
+# Key codes.
+SPACE, K, G = 49, 40, 5
+
+
+# Feed a stream of ("key", flags, keycode, time) and ("flags", flags, time) events to a machine.
+def feed(machine, events):
+    results = []
+    for event in events:
+        if event[0] == "key":
+            results.append(machine.key_down(*event[1:]))
+        else:
+            results.append(machine.flags_changed(*event[1:]))
+    return results
+
+
+def test_combo():
+    machine = triggers.compile_trigger({"flags": OPTION, "key": SPACE})
+    assert feed(machine, [
+        ("flags", OPTION, 0.0),
+        ("key", OPTION, SPACE, 0.1),
+        ("key", 0, SPACE, 0.2),
+        ("key", OPTION | SHIFT, SPACE, 0.3),
+        ("key", OPTION, K, 0.4),
+    ]) == [triggers.NO_MATCH, triggers.MATCH, triggers.NO_MATCH, triggers.NO_MATCH, triggers.NO_MATCH]
+
+
+def test_double_tap():
+    machine = triggers.compile_trigger({"type": "double_tap", "flags": OPTION})
+    assert feed(machine, [
+        ("flags", OPTION, 0.0),
+        ("flags", 0, 0.1),
+        ("flags", OPTION, 0.3),
+    ])[-1] == triggers.MATCH
+    # Matching resets the machine, a third tap alone does not match again.
+    assert feed(machine, [("flags", 0, 0.4), ("flags", OPTION, 0.5)]) == [triggers.NO_MATCH, triggers.NO_MATCH]
+
+
+def test_double_tap_timeout():
+    machine = triggers.compile_trigger({"type": "double_tap", "flags": OPTION})
+    late = triggers.DOUBLE_TAP_INTERVAL + 0.05
+    assert feed(machine, [
+        ("flags", OPTION, 0.0),
+        ("flags", 0, 0.1),
+        ("flags", OPTION, 0.1 + late),
+    ])[-1] == triggers.NO_MATCH
+
+
+def test_double_tap_reset_by_key_or_other_modifier():
+    machine = triggers.compile_trigger({"type": "double_tap", "flags": OPTION})
+    # A key pressed between the taps (Option used as a modifier).
+    assert feed(machine, [
+        ("flags", OPTION, 0.0),
+        ("key", OPTION, K, 0.05),
+        ("flags", 0, 0.1),
+        ("flags", OPTION, 0.2),
+    ])[-1] == triggers.NO_MATCH
+    machine.reset()
+    # A different modifier between the taps.
+    assert feed(machine, [
+        ("flags", OPTION, 1.0),
+        ("flags", 0, 1.1),
+        ("flags", SHIFT, 1.15),
+        ("flags", 0, 1.2),
+        ("flags", OPTION, 1.25),
+    ])[-1] == triggers.NO_MATCH
+
+
+def test_sequence():
+    machine = triggers.compile_trigger({"type": "sequence", "steps": [
+        {"flags": CONTROL, "key": K}, {"flags": 0, "key": G},
+    ]})
+    assert feed(machine, [
+        ("key", CONTROL, K, 0.0),
+        ("key", 0, G, 0.5),
+    ]) == [triggers.PARTIAL, triggers.MATCH]
+    # A wrong second step breaks the sequence.
+    assert feed(machine, [
+        ("key", CONTROL, K, 1.0),
+        ("key", 0, K, 1.1),
+        ("key", 0, G, 1.2),
+    ]) == [triggers.PARTIAL, triggers.NO_MATCH, triggers.NO_MATCH]
+    # Repeating the first step starts a new attempt.
+    assert feed(machine, [
+        ("key", CONTROL, K, 2.0),
+        ("key", CONTROL, K, 2.1),
+        ("key", 0, G, 2.2),
+    ]) == [triggers.PARTIAL, triggers.PARTIAL, triggers.MATCH]
+
+
+def test_sequence_timeout():
+    machine = triggers.compile_trigger({"type": "sequence", "steps": [
+        {"flags": CONTROL, "key": K}, {"flags": 0, "key": G},
+    ]})
+    late = triggers.SEQUENCE_TIMEOUT + 0.1
+    assert feed(machine, [
+        ("key", CONTROL, K, 0.0),
+        ("key", 0, G, late),
+    ]) == [triggers.PARTIAL, triggers.NO_MATCH]
+    assert machine.state == 0
+
+
+def test_reset():
+    machine = triggers.compile_trigger({"type": "sequence", "steps": [
+        {"flags": CONTROL, "key": K}, {"flags": 0, "key": G},
+    ]})
+    assert machine.key_down(CONTROL, K, 0.0) == triggers.PARTIAL
+    machine.reset()
+    assert machine.key_down(0, G, 0.1) == triggers.NO_MATCH
+
+
+def test_invalid_triggers():
+    with pytest.raises(KeyError):
+        triggers.compile_trigger({"flags": OPTION})
+    with pytest.raises(ValueError):
+        triggers.compile_trigger({"type": "double_tap", "flags": 0})
+    with pytest.raises(ValueError):
+        triggers.compile_trigger({"type": "sequence", "steps": [{"flags": CONTROL, "key": K}]})
+    with pytest.raises(ValueError):
+        triggers.compile_trigger({"type": "chord", "flags": OPTION, "key": K})
+
+
+def test_recorder_combo_and_sequence():
+    recorder = triggers.TriggerRecorder()
+    assert recorder.finish() is None
+    recorder.flags_changed(OPTION, 0.0)
+    assert recorder.key_down(OPTION, SPACE, 0.1) is False
+    assert recorder.finish() == {"flags": OPTION, "key": SPACE}
+    recorder.key_down(0, G, 0.3)
+    assert recorder.finish() == {"type": "sequence", "steps": [
+        {"flags": OPTION, "key": SPACE}, {"flags": 0, "key": G},
+    ]}
+    # The step limit ends the recording.
+    recorder = triggers.TriggerRecorder(max_steps=2)
+    assert recorder.key_down(CONTROL, K, 0.0) is False
+    assert recorder.key_down(0, G, 0.1) is True
+
+
+def test_recorder_double_tap():
+    recorder = triggers.TriggerRecorder()
+    results = [recorder.flags_changed(*event) for event in [
+        (OPTION, 0.0), (0, 0.1), (OPTION, 0.2), (0, 0.3),
+    ]]
+    assert results[:-1] == [None, None, None]
+    assert results[-1] == {"type": "double_tap", "flags": OPTION}
+    # Taps too far apart, or of different modifiers, are not a double tap.
+    recorder = triggers.TriggerRecorder()
+    assert [recorder.flags_changed(*event) for event in [
+        (OPTION, 0.0), (0, 0.1), (SHIFT, 0.2), (0, 0.3),
+    ]] == [None] * 4
+    recorder = triggers.TriggerRecorder()
+    late = triggers.DOUBLE_TAP_INTERVAL + 0.1
+    assert [recorder.flags_changed(*event) for event in [
+        (OPTION, 0.0), (0, 0.1), (OPTION, 0.1 + late), (0, 0.2 + late),
+    ]] == [None] * 4
+
+
+def test_recorded_triggers_compile():
+    recorder = triggers.TriggerRecorder()
+    recorder.key_down(CONTROL, K, 0.0)
+    recorder.key_down(0, G, 0.1)
+    machine = triggers.compile_trigger(recorder.finish())
+    assert feed(machine, [("key", CONTROL, K, 1.0), ("key", 0, G, 1.1)]) == [triggers.PARTIAL, triggers.MATCH]